@@ -14,13 +14,20 @@ from curl_cffi import requests as cffi_requests
 from bs4 import BeautifulSoup
 import asyncio
 import json
+import queue
+import threading
+from collections import OrderedDict
 import streamlit as st
 import random
 import uuid
 from langchain_openai.chat_models.base import BaseChatOpenAI
 from langchain.callbacks.manager import CallbackManager
 from langchain.callbacks.tracers import LangChainTracer
-memory = MemorySaver()
+from utils.get_model import get_model, get_structured_model
+
+# Conversations kept in the agent's checkpointer; the least recently used
+# are deleted beyond this many
+MAX_CONVERSATIONS = 256
 
 
 
@@ -340,18 +347,11 @@ Remember: If ALL fields above show actual values (not None), you MUST stop askin
 
 class Agent:
     def __init__(self, model, tools, checkpointer=None, system=""):
-        test_model = BaseChatOpenAI(
-            model="deepseek-chat",
-            openai_api_key="sk-8e128b8744524265be579501612ee5c1",
-            openai_api_base="https://api.deepseek.com",
-            max_tokens=1024
-        )
-
         self.system = system
-        self.extraction_from_interaction_llm = test_model.with_structured_output(KnowledgeState, method="function_calling")
-        self.extraction_from_scraped_content_llm = test_model.with_structured_output(ScrapedKnowledgeState, method="function_calling")
-        self.router_llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo").with_structured_output(RouterOutput, method="function_calling")
-        self.follow_up_llm = ChatOpenAI(temperature=0, model="gpt-4o-mini")
+        self.extraction_from_interaction_llm = get_structured_model("deepseek-chat", KnowledgeState, method="function_calling")
+        self.extraction_from_scraped_content_llm = get_structured_model("deepseek-chat", ScrapedKnowledgeState, method="function_calling")
+        self.router_llm = get_structured_model("gpt-3.5-turbo", RouterOutput, method="function_calling")
+        self.follow_up_llm = get_model("gpt-4o-mini")
         
         graph = StateGraph(AgentState)
         graph.add_node("router", self.route_message)
@@ -471,7 +471,7 @@ class Agent:
 
 # asyncio.run(chat("hi! I'm Lance", knowledge=KnowledgeState()))
 
-async def stream_response(state, config, response_placeholder, abot):
+async def stream_response(state, config, on_update, abot):
     response = ""
     was_tool_displayed = False
     was_extraction_displayed = False
@@ -479,25 +479,95 @@ async def stream_response(state, config, response_placeholder, abot):
         if event["event"] == "on_chat_model_stream":
             content = event["data"]["chunk"].content
             response += content
-            response_placeholder.markdown(response)
+            on_update(response)
         elif event["event"] == "on_chain_start":
             try:
                 if not was_tool_displayed and event["data"]["input"]["route_decision"].tool_call:
                     response += "\n\nscraping agency...\n\n"
-                    response_placeholder.markdown(response)
+                    on_update(response)
                     was_tool_displayed = True
                 if not was_extraction_displayed and event['name'] == 'extract_knowledge':
                     response += "\n\nUpdating knowledge 🧠✨ ...\n\n If this takes too long, it is deepseek's fault, not mine. Sometimes they suck ☭ 🇨🇳\n\n"
-                    response_placeholder.markdown(response)
+                    on_update(response)
                     was_extraction_displayed = True
             except:
                 pass
     return response
 
+class Conversations:
+    """Thread ids in a checkpointer, least recently used first.
+
+    Streamlit doesn't say when a session ends, so beyond max_size the oldest
+    conversation's checkpoints are deleted instead.
+    """
+
+    def __init__(self, checkpointer, max_size: int = MAX_CONVERSATIONS):
+        self.checkpointer = checkpointer
+        self.max_size = max_size
+        self._thread_ids: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, thread_id: str):
+        with self._lock:
+            self._thread_ids[thread_id] = None
+            self._thread_ids.move_to_end(thread_id)
+            while len(self._thread_ids) > self.max_size:
+                oldest, _ = self._thread_ids.popitem(last=False)
+                self.checkpointer.delete_thread(oldest)
+
+def turn_input(abot: Agent, config, history: list, knowledge) -> dict:
+    """Graph input for a chat turn whose user message is the last one in history.
+
+    The checkpointer already holds the thread's messages, so only the new one
+    is sent; a thread without a checkpoint (new, or evicted) gets the whole
+    history.
+    """
+    messages = [
+        HumanMessage(content=msg["content"]) if msg["role"] == "user" else AIMessage(content=msg["content"])
+        for msg in history
+    ]
+    if abot.graph.get_state(config).values:
+        messages = messages[-1:]
+    return {"messages": messages, "knowledge": knowledge}
+
+@st.cache_resource(show_spinner=False)
+def get_agent() -> Agent:
+    """The compiled onboarding graph and its model clients, built once per process.
+
+    Conversations are kept apart by thread_id in the shared checkpointer.
+    """
+    return Agent(get_model("gpt-4o-mini"), [], system=system_prompt, checkpointer=MemorySaver())
+
+@st.cache_resource(show_spinner=False)
+def get_conversations() -> Conversations:
+    return Conversations(get_agent().graph.checkpointer)
+
+@st.cache_resource(show_spinner=False)
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Event loop running in a background thread for every session's graph runs"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+    return loop
+
+def run_agent(abot: Agent, state, config, response_placeholder) -> str:
+    """Stream one graph run on the shared loop, rendering updates from this (the script) thread"""
+    updates = queue.Queue()
+
+    async def run():
+        try:
+            return await stream_response(state, config, updates.put, abot)
+        finally:
+            updates.put(None)
+
+    future = asyncio.run_coroutine_threadsafe(run(), get_event_loop())
+    # Streamlit elements can only be updated from the script thread
+    while (response := updates.get()) is not None:
+        response_placeholder.markdown(response)
+    return future.result()
+
 def main():
-    model = ChatOpenAI(model="gpt-4o-mini", temperature=0, api_key=st.secrets["OPENAI_API_KEY"])
-    abot = Agent(model, [], system=system_prompt, checkpointer=memory)
     st.set_page_config(layout="wide")
+    abot = get_agent()
 
     # Add custom CSS for the chat container with fixed input at bottom
     st.markdown("""
@@ -569,16 +639,13 @@ def main():
                 with st.chat_message("user"):
                     st.markdown(prompt)
                 
-                state = {
-                    "messages": [HumanMessage(content=msg["content"]) for msg in st.session_state.messages],
-                    "knowledge": st.session_state.knowledge
-                }
-                
                 config = {"configurable": {"thread_id": st.session_state.thread_id}}
+                get_conversations().touch(st.session_state.thread_id)
+                state = turn_input(abot, config, st.session_state.messages, st.session_state.knowledge)
                 
                 with st.chat_message("assistant"):
                     response_placeholder = st.empty()
-                    response = asyncio.run(stream_response(state, config, response_placeholder, abot))
+                    response = run_agent(abot, state, config, response_placeholder)
                 
                 st.session_state.messages.append({"role": "assistant", "content": response})
                 
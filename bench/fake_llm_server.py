@@ -0,0 +1,258 @@
+"""OpenAI- and Anthropic-compatible stub server for benchmarking.
+
+Answers /v1/chat/completions (OpenAI, DeepSeek) and /v1/messages (Anthropic),
+plain or streamed, and fills tool calls / JSON schemas with made-up values.
+Each model gets a latency profile:
+
+    latency            seconds before the first token
+    tokens_per_second  generation speed after that
+    jitter             +/- fraction applied to both
+    output_tokens      length of free-text answers
+
+Profiles are read from FAKE_LLM_PROFILES (JSON, {model or "default": profile})
+and replace the built-in ones; missing keys fall back to the "default" profile.
+
+    python -m bench.fake_llm_server --port 8900 --profiles '{"default": {"latency": 0.2}}'
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from typing import Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+BASE_PROFILE = {'latency': 0.5, 'tokens_per_second': 80, 'jitter': 0.2, 'output_tokens': 250}
+
+# Rough relative speeds of the real providers
+DEFAULT_PROFILES = {
+    'gpt-4o-mini': {'latency': 0.3, 'tokens_per_second': 120},
+    'deepseek-chat': {'latency': 1.0, 'tokens_per_second': 40},
+    'claude-3-5-sonnet-20240620': {'latency': 0.8, 'tokens_per_second': 60}
+}
+
+WORDS = """we have built similar platforms for clients in this space and would start with a short
+discovery call to confirm scope then deliver the first milestone within two weeks our team
+covers design backend frontend and deployment""".split()
+
+app = FastAPI()
+
+profiles: Dict[str, dict] = {}
+# System prompts seen before, to report provider-style prefix cache hits
+_seen_prefixes = set()
+
+
+def load_profiles(raw: str = None):
+    configured = json.loads(raw) if raw else DEFAULT_PROFILES
+    profiles.clear()
+    profiles.update(configured)
+    profiles['default'] = dict(BASE_PROFILE, **configured.get('default', {}))
+
+
+load_profiles(os.environ.get('FAKE_LLM_PROFILES'))
+
+
+def profile_for(model: str) -> dict:
+    profile = dict(profiles['default'])
+    profile.update(profiles.get(model, {}))
+    jitter = profile['jitter']
+    profile['latency'] *= random.uniform(1 - jitter, 1 + jitter)
+    profile['tokens_per_second'] *= random.uniform(1 - jitter, 1 + jitter)
+    return profile
+
+
+def count_tokens(content) -> int:
+    """Rough token count (4 characters per token) of a string or a list of content blocks"""
+    if isinstance(content, list):
+        return sum(count_tokens(block.get('text', '') if isinstance(block, dict) else block) for block in content)
+    return max(1, len(content or '') // 4)
+
+
+def cached_tokens(system_content) -> int:
+    text = json.dumps(system_content)
+    key = hashlib.sha256(text.encode()).hexdigest()
+    if key in _seen_prefixes:
+        return count_tokens(system_content)
+    _seen_prefixes.add(key)
+    return 0
+
+
+def fake_arguments(schema: dict, seed: str) -> dict:
+    """Values for every property of a JSON schema, deterministic per request"""
+    score = int(hashlib.sha256(seed.encode()).hexdigest(), 16) % 101
+    arguments = {}
+    for name, spec in schema.get('properties', {}).items():
+        kind = spec.get('type')
+        if kind in ('integer', 'number'):
+            arguments[name] = score
+        elif kind == 'boolean':
+            arguments[name] = score >= 50
+        elif kind == 'array':
+            arguments[name] = []
+        elif 'score' in name:
+            arguments[name] = str(score)
+        else:
+            arguments[name] = f"Scored {score} by the benchmark stub."
+    return arguments
+
+
+def fake_text(n_tokens: int) -> List[str]:
+    return [WORDS[index % len(WORDS)] + ' ' for index in range(n_tokens)]
+
+
+async def stream_events(events, profile: dict):
+    await asyncio.sleep(profile['latency'])
+    for index, event in enumerate(events):
+        if index:
+            await asyncio.sleep(1 / profile['tokens_per_second'])
+        yield event
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get('model', 'default')
+    profile = profile_for(model)
+    messages = body.get('messages', [])
+    seed = json.dumps(messages[-1:])
+
+    input_tokens = sum(count_tokens(message.get('content')) for message in messages)
+    system = [message.get('content') for message in messages if message.get('role') == 'system']
+    usage = {
+        'prompt_tokens': input_tokens,
+        'prompt_tokens_details': {'cached_tokens': cached_tokens(system) if system else 0}
+    }
+
+    message = {'role': 'assistant', 'content': None}
+    finish_reason = 'stop'
+    response_format = body.get('response_format') or {}
+    if body.get('tools'):
+        function = body['tools'][0]['function']
+        arguments = json.dumps(fake_arguments(function.get('parameters', {}), seed))
+        message['tool_calls'] = [{
+            'id': f"call_{uuid.uuid4().hex[:24]}",
+            'type': 'function',
+            'function': {'name': function['name'], 'arguments': arguments}
+        }]
+        finish_reason = 'tool_calls'
+        tokens = [arguments]
+        output_tokens = count_tokens(arguments)
+    elif response_format.get('type') == 'json_schema':
+        message['content'] = json.dumps(fake_arguments(response_format['json_schema'].get('schema', {}), seed))
+        tokens = [message['content']]
+        output_tokens = count_tokens(message['content'])
+    else:
+        tokens = fake_text(min(body.get('max_tokens') or profile['output_tokens'], profile['output_tokens']))
+        message['content'] = ''.join(tokens)
+        output_tokens = len(tokens)
+    usage['completion_tokens'] = output_tokens
+    usage['total_tokens'] = input_tokens + output_tokens
+
+    response_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    def chunk(delta: dict, finish=None, **extra) -> str:
+        payload = {
+            'id': response_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}], **extra
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    if not body.get('stream'):
+        await asyncio.sleep(profile['latency'] + output_tokens / profile['tokens_per_second'])
+        return {
+            'id': response_id, 'object': 'chat.completion', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            'usage': usage
+        }
+
+    events = [chunk({'role': 'assistant', 'content': ''})]
+    if message.get('tool_calls'):
+        events.append(chunk({'tool_calls': [dict(message['tool_calls'][0], index=0)]}))
+    else:
+        events.extend(chunk({'content': token}) for token in tokens)
+    events.append(chunk({}, finish_reason))
+    if (body.get('stream_options') or {}).get('include_usage'):
+        events.append(f"data: {json.dumps({'id': response_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n")
+    events.append("data: [DONE]\n\n")
+    return StreamingResponse(stream_events(events, profile), media_type="text/event-stream")
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    body = await request.json()
+    model = body.get('model', 'default')
+    profile = profile_for(model)
+    seed = json.dumps(body.get('messages', [])[-1:])
+
+    system = body.get('system')
+    cache_read = cached_tokens(system) if system else 0
+    input_tokens = count_tokens(system) + sum(count_tokens(message.get('content')) for message in body.get('messages', []))
+    usage = {
+        'input_tokens': input_tokens - cache_read,
+        'cache_creation_input_tokens': 0,
+        'cache_read_input_tokens': cache_read
+    }
+
+    if body.get('tools'):
+        tool = body['tools'][0]
+        block = {
+            'type': 'tool_use', 'id': f"toolu_{uuid.uuid4().hex[:24]}",
+            'name': tool['name'], 'input': fake_arguments(tool.get('input_schema', {}), seed)
+        }
+        stop_reason = 'tool_use'
+        tokens = []
+        output_tokens = count_tokens(json.dumps(block['input']))
+    else:
+        tokens = fake_text(min(body.get('max_tokens') or profile['output_tokens'], profile['output_tokens']))
+        block = {'type': 'text', 'text': ''.join(tokens)}
+        stop_reason = 'end_turn'
+        output_tokens = len(tokens)
+
+    message = {
+        'id': f"msg_{uuid.uuid4().hex[:24]}", 'type': 'message', 'role': 'assistant', 'model': model,
+        'content': [block], 'stop_reason': stop_reason, 'stop_sequence': None,
+        'usage': dict(usage, output_tokens=output_tokens)
+    }
+
+    if not body.get('stream'):
+        await asyncio.sleep(profile['latency'] + output_tokens / profile['tokens_per_second'])
+        return message
+
+    def event(name: str, payload: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(dict(payload, type=name))}\n\n"
+
+    start = dict(message, content=[], stop_reason=None, usage=dict(usage, output_tokens=1))
+    events = [event('message_start', {'message': start})]
+    if block['type'] == 'tool_use':
+        events.append(event('content_block_start', {'index': 0, 'content_block': dict(block, input={})}))
+        events.append(event('content_block_delta', {'index': 0, 'delta': {'type': 'input_json_delta', 'partial_json': json.dumps(block['input'])}}))
+    else:
+        events.append(event('content_block_start', {'index': 0, 'content_block': {'type': 'text', 'text': ''}}))
+        events.extend(event('content_block_delta', {'index': 0, 'delta': {'type': 'text_delta', 'text': token}}) for token in tokens)
+    events.append(event('content_block_stop', {'index': 0}))
+    events.append(event('message_delta', {'delta': {'stop_reason': stop_reason, 'stop_sequence': None}, 'usage': {'output_tokens': output_tokens}}))
+    events.append(event('message_stop', {}))
+    return StreamingResponse(stream_events(events, profile), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--profiles', help='JSON profiles, replacing the built-in ones (see FAKE_LLM_PROFILES)')
+    args = parser.parse_args()
+    if args.profiles:
+        load_profiles(args.profiles)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,198 @@
+"""Load test for suitability_api against the fake LLM server.
+
+Starts bench.fake_llm_server and the API (both with uvicorn), points the
+model clients at the stub through the *_BASE_URL variables, then drives
+/analyze-job and /generate-proposal at each requested concurrency level with
+the jobs in bench/seed_jobs.jsonl. Reports throughput and p50/p95/p99 latency.
+
+    python -m bench.run_load --concurrency 1,8,32 --requests 200 --workers 2
+    python -m bench.run_load --api-url http://127.0.0.1:8000 --endpoints analyze-job
+
+The provider quotas in utils/get_model still apply, so with the default
+models the slowest quota (Anthropic tokens/min) soon dominates; pass --models
+to measure one provider at a time. Unless --allow-cache-hits is given, the
+started API runs with near-duplicate reuse off (an --api-url server should
+too, or it measures reuse rather than model calls). Needs uvicorn and httpx.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENDPOINTS = {
+    'analyze-job': '/analyze-job',
+    'generate-proposal': '/generate-proposal'
+}
+
+
+def load_jobs(path: Path) -> List[dict]:
+    jobs = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                jobs.append({'title': record['title'], 'description': record['description']})
+    return jobs
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def start_server(module: str, port: int, env: Dict[str, str], workers: int = 1) -> subprocess.Popen:
+    command = [sys.executable, '-m', 'uvicorn', module, '--host', '127.0.0.1', '--port', str(port),
+               '--workers', str(workers), '--log-level', 'warning']
+    return subprocess.Popen(command, cwd=ROOT, env=env)
+
+
+def wait_until_ready(url: str, timeout: float = 60):
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_level(api_url: str, endpoint: str, jobs: List[dict], models: Optional[List[str]],
+                    concurrency: int, n_requests: int, unique: bool, run_id: str) -> dict:
+    """Send n_requests to one endpoint from `concurrency` parallel clients"""
+    counter = itertools.count()
+    latencies, errors = [], {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=300) as client:
+        async def worker():
+            while (index := next(counter)) < n_requests:
+                job = dict(jobs[index % len(jobs)])
+                if unique:
+                    # Keeps the result cache from answering repeats
+                    job['description'] += f"\n\n(load test {run_id}-{endpoint}-{concurrency}-{index})"
+                if models:
+                    job['models'] = models
+
+                started = time.perf_counter()
+                try:
+                    response = await client.post(ENDPOINTS[endpoint], json=job)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if status == '200':
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[status] = errors.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'errors': errors,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1)
+    }
+
+
+def print_report(results: List[dict]):
+    header = f"{'endpoint':<20}{'conc':>6}{'ok':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        n_errors = sum(result['errors'].values())
+        print(f"{result['endpoint']:<20}{result['concurrency']:>6}{result['requests'] - n_errors:>7}{n_errors:>8}"
+              f"{result['throughput_rps']:>9}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per endpoint and level')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='Comma-separated: ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--models', help='Comma-separated models to request (default: the API default)')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers for the API')
+    parser.add_argument('--seed-file', default=str(ROOT / 'bench' / 'seed_jobs.jsonl'), help='JSONL with title and description per line')
+    parser.add_argument('--profiles', help='JSON latency profiles for the fake LLM server, replacing its built-in ones')
+    parser.add_argument('--api-url', help='Benchmark an already running API instead of starting one')
+    parser.add_argument('--api-port', type=int, default=8800)
+    parser.add_argument('--fake-port', type=int, default=8900)
+    parser.add_argument('--allow-cache-hits', action='store_true', help='Send repeated jobs as-is')
+    parser.add_argument('--output', help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    jobs = load_jobs(Path(args.seed_file))
+    models = args.models.split(',') if args.models else None
+    levels = [int(level) for level in args.concurrency.split(',')]
+    endpoints = args.endpoints.split(',')
+    for endpoint in endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"Unknown endpoint {endpoint}")
+
+    processes = []
+    try:
+        api_url = args.api_url
+        if api_url is None:
+            fake_url = f"http://127.0.0.1:{args.fake_port}"
+            env = dict(
+                os.environ,
+                FAKE_LLM_PROFILES=args.profiles or '',
+                OPENAI_BASE_URL=f"{fake_url}/v1",
+                DEEPSEEK_BASE_URL=f"{fake_url}/v1",
+                ANTHROPIC_BASE_URL=fake_url,
+                OPENAI_API_KEY='bench', DEEPSEEK_API_KEY='bench', ANTHROPIC_API_KEY='bench',
+                LANGCHAIN_TRACING_V2='false',
+                # A uniqueness suffix barely moves a job's SimHash, so without
+                # this "unique" requests would be served as near-duplicates
+                NEAR_DUPLICATE_LOOKUP='on' if args.allow_cache_hits else 'off',
+                SUITABILITY_CACHE_PATH=os.path.join(tempfile.mkdtemp(), 'bench_cache.db')
+            )
+            processes.append(start_server('bench.fake_llm_server:app', args.fake_port, env))
+            wait_until_ready(f"{fake_url}/health")
+            api_url = f"http://127.0.0.1:{args.api_port}"
+            processes.append(start_server('suitability_api:app', args.api_port, env, args.workers))
+            wait_until_ready(f"{api_url}/available-models")
+
+        run_id = str(int(time.time()))
+        results = []
+        for endpoint in endpoints:
+            for concurrency in levels:
+                result = asyncio.run(run_level(api_url, endpoint, jobs, models, concurrency, args.requests,
+                                               not args.allow_cache_hits, run_id))
+                result['workers'] = args.workers
+                results.append(result)
+                print(f"{endpoint} @ {concurrency}: {result['throughput_rps']} req/s, p95 {result['p95_ms']} ms", file=sys.stderr)
+
+        print_report(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,293 @@
+import asyncio
+import os
+import queue
+import threading
+import time
 import requests
-from typing import Optional, Dict, List, Any
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Iterator, List, Any, Sequence
 
-API_URL = "http://localhost:3003"
+API_URL = os.environ.get("JOBS_API_URL", "http://localhost:3003")
+
+# (connect, read) timeouts in seconds
+REQUEST_TIMEOUT = (3.05, 30)
+
+def _create_session() -> requests.Session:
+    """Keep-alive session shared by every call to the jobs API"""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET'])
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+session = _create_session()
+
+# Pages of search results, keyed by (filters, limit, offset). Entries are
+# futures so a page that is still being prefetched is waited on, not refetched.
+PAGE_CACHE_SIZE = 64
+PAGE_TTL = 300
+_pages: "OrderedDict[tuple, tuple]" = OrderedDict()
+_pages_lock = threading.Lock()
+_prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="jobs-prefetch")
+
+def _search_jobs(limit: int, offset: int, filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # requests encodes the values and repeats the key for list filters
+    params = {
+        'limit': limit,
+        'offset': offset,
+        **(filters or {})
+    }
+
+    response = session.get(f"{API_URL}/jobs/search", params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+def _fetch_jobs(limit: int, offset: int, filters: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+    return [{
+        'description': job.get('description', ''),
+        'title': job.get('title', '')
+    } for job in _search_jobs(limit, offset, filters)]
+
+def _page_key(limit: int, offset: int, filters: Optional[Dict[str, Any]]) -> tuple:
+    # Empty filters don't change the query, so {} and {'skills': []} share pages
+    normalized = tuple(sorted(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in (filters or {}).items() if value not in (None, '', [])
+    ))
+    return normalized, limit, offset
+
+def _claim(future: Future) -> bool:
+    """Mark a page fetch as started; False if someone else already started it"""
+    with _pages_lock:
+        return not future.running() and not future.done() and future.set_running_or_notify_cancel()
+
+def _fill(future: Future, limit: int, offset: int, filters: Optional[Dict[str, Any]]):
+    if not _claim(future):
+        return
+    try:
+        future.set_result(_fetch_jobs(limit, offset, filters))
+    except Exception as e:
+        future.set_exception(e)
+
+def _page(limit: int, offset: int, filters: Optional[Dict[str, Any]], prefetch: bool = False) -> Future:
+    """The cached (or newly started) fetch of one page.
+
+    Misses are fetched in the calling thread, and so is a page that is still
+    queued for prefetch, so a visible page never waits behind background work.
+    """
+    key = _page_key(limit, offset, filters)
+    created = False
+    with _pages_lock:
+        entry = _pages.get(key)
+        if entry is not None and time.monotonic() - entry[1] < PAGE_TTL:
+            _pages.move_to_end(key)
+            future = entry[0]
+        else:
+            created = True
+            # Registered before fetching so concurrent callers share the fetch
+            future = Future()
+            _pages[key] = (future, time.monotonic())
+            while len(_pages) > PAGE_CACHE_SIZE:
+                _pages.popitem(last=False)
+
+            def forget_failure(done: Future):
+                if done.exception() is not None:
+                    with _pages_lock:
+                        if _pages.get(key, (None,))[0] is done:
+                            del _pages[key]
+            future.add_done_callback(forget_failure)
+
+    if prefetch:
+        if created:
+            _prefetcher.submit(_fill, future, limit, offset, filters)
+    else:
+        _fill(future, limit, offset, filters)
+    return future
+
+def prefetch_jobs(limit: int = 10, offset: int = 0, filters: Optional[Dict[str, Any]] = None):
+    """Start fetching a page in the background unless it is already cached"""
+    _page(limit, offset, filters, prefetch=True)
+
+def invalidate_jobs_cache():
+    with _pages_lock:
+        _pages.clear()
 
 def get_jobs(limit: int = 10, offset: int = 0, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
-    """Fetch jobs from API with pagination and filters"""
+    """Fetch jobs from API with pagination and filters.
+
+    Pages are served from the page cache when possible, and the next page is
+    prefetched as soon as this one is returned.
+    """
     try:
-        params = {
-            'offset': offset,
-            **(filters or {})
-        }
-        
-        # Convert list filters to multiple query params
-        query_params = []
-        for key, value in params.items():
-            if isinstance(value, list):
-                for item in value:
-                    query_params.append(f"{key}={item}")
-            else:
-                query_params.append(f"{key}={value}")
-        
-        url = f"{API_URL}/jobs/search?{'&'.join(query_params)}"
-        print(url)
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        jobs = response.json()
-        return [{
-            'description': job.get('description', ''),
-            'title': job.get('title', '')
-        } for job in jobs]
-        
+        jobs = _page(limit, offset, filters).result()
     except Exception as e:
         st.error(f"Failed to fetch jobs: {str(e)}")
         raise
 
+    if len(jobs) == limit:
+        prefetch_jobs(limit, offset + limit, filters)
+    # Callers extend the list they get back, so never hand out the cached one
+    return list(jobs)
+
+_END_OF_JOBS = object()
+
+def iter_jobs(
+    filters: Optional[Dict[str, Any]] = None,
+    page_size: int = 100,
+    fields: Optional[Sequence[str]] = ('title', 'description'),
+    read_ahead: int = 2
+) -> Iterator[Dict[str, Any]]:
+    """Lazily yield every job matching the filters, one page at a time.
+
+    A background thread fetches up to `read_ahead` pages ahead of the
+    consumer and then blocks, so memory stays bounded however many jobs
+    match. Only `fields` are kept (None keeps the whole record). Pages
+    bypass the page cache.
+    """
+    # maxsize 0 would make the queue unbounded
+    pages: queue.Queue = queue.Queue(maxsize=max(1, read_ahead))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        offset = 0
+        try:
+            while not stop.is_set():
+                page = _search_jobs(page_size, offset, filters)
+                if fields is not None:
+                    page = [{field: job.get(field) for field in fields} for job in page]
+                # The backend may cap limit below page_size, so a short page
+                # doesn't mean the end; only an empty one does
+                if not page:
+                    break
+                if not put(page):
+                    return
+                offset += len(page)
+            put(_END_OF_JOBS)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=produce, name="iter-jobs", daemon=True).start()
+    try:
+        while True:
+            page = pages.get()
+            if page is _END_OF_JOBS:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield from page
+    finally:
+        # Also runs when the caller stops iterating early
+        stop.set()
+
+def _parse_filter_options(data: Dict[str, Any]) -> Dict[str, List[str]]:
+    return {
+        'categories': [option['key'] for option in data.get('categories', [])],
+        'locations': [option['key'] for option in data.get('locations', [])],
+        'projectTypes': [option['key'] for option in data.get('projectTypes', [])],
+        'paymentTypes': [option['key'] for option in data.get('paymentTypes', [])],
+        'skills': data.get('skills', [])
+    }
+
+class FilterOptionsCache:
+    """Process-wide copy of /jobs/filter-options, shared by every session.
+
+    Fresh for `ttl` seconds. After that the stale copy keeps being served
+    while one background request revalidates it with If-None-Match /
+    If-Modified-Since, so only the very first call waits on the network.
+    """
+
+    def __init__(self, ttl: float = 600):
+        self.ttl = ttl
+        self.value: Optional[Dict[str, List[str]]] = None
+        self.fetched_at = 0.0
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def _fetch(self):
+        headers = {}
+        if self.value is not None:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+
+        response = session.get(f"{API_URL}/jobs/filter-options", headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code != 304:
+            response.raise_for_status()
+            value = _parse_filter_options(response.json())
+            with self._lock:
+                self.value = value
+                self.etag = response.headers.get('ETag')
+                self.last_modified = response.headers.get('Last-Modified')
+        with self._lock:
+            self.fetched_at = time.monotonic()
+
+    def _revalidate(self):
+        try:
+            self._fetch()
+        except Exception:
+            # Keep serving the stale copy; the next get() tries again
+            pass
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get(self) -> Dict[str, List[str]]:
+        with self._lock:
+            if self.value is not None:
+                if time.monotonic() - self.fetched_at >= self.ttl and not self._refreshing:
+                    self._refreshing = True
+                    _prefetcher.submit(self._revalidate)
+                return self.value
+
+        # Nothing cached yet: one caller fetches, concurrent ones wait for it
+        with self._fetch_lock:
+            if self.value is None:
+                self._fetch()
+        return self.value
+
+filter_options_cache = FilterOptionsCache(ttl=float(os.environ.get("FILTER_OPTIONS_TTL", 600)))
+
 def get_filter_options() -> Dict[str, List[str]]:
-    """Fetch available filter options from API"""
+    """Fetch available filter options from API (served from the shared cache)"""
     try:
-        response = requests.get(f"{API_URL}/jobs/filter-options")
-        response.raise_for_status()
-        data = response.json()
-        
-        return {
-            'categories': [option['key'] for option in data.get('categories', [])],
-            'locations': [option['key'] for option in data.get('locations', [])],
-            'projectTypes': [option['key'] for option in data.get('projectTypes', [])],
-            'paymentTypes': [option['key'] for option in data.get('paymentTypes', [])],
-            'skills': data.get('skills', [])
-        }
+        return filter_options_cache.get()
     except Exception as e:
         st.error(f"Failed to fetch filter options: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+# The async variants are not natively async: they run the blocking calls in a
+# worker thread. That keeps one page cache, one retry policy and one
+# connection pool for both; an httpx.AsyncClient would need its own copy of
+# each (httpx transports only retry failed connects, not 429/5xx responses).
+# Each call ties up a thread of the default executor while it waits.
+
+async def aget_jobs(limit: int = 10, offset: int = 0, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """get_jobs run in a worker thread, off the event loop"""
+    return await asyncio.to_thread(get_jobs, limit, offset, filters)
+
+async def aget_filter_options() -> Dict[str, List[str]]:
+    """get_filter_options run in a worker thread, off the event loop"""
+    return await asyncio.to_thread(get_filter_options)
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+
+class TokenUsage(BaseModel):
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    uncached_input_tokens: int = 0
+    output_tokens: int = 0
+
+    @classmethod
+    def from_message(cls, message) -> "TokenUsage":
+        usage = getattr(message, 'usage_metadata', None) or {}
+        input_tokens = usage.get('input_tokens', 0)
+        cached = (usage.get('input_token_details') or {}).get('cache_read')
+        if cached is None:
+            # DeepSeek reports its prefix cache hits outside the standard fields
+            token_usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+            cached = token_usage.get('prompt_cache_hit_tokens', 0)
+        return cls(
+            input_tokens=input_tokens,
+            cached_input_tokens=cached,
+            uncached_input_tokens=max(0, input_tokens - cached),
+            output_tokens=usage.get('output_tokens', 0)
+        )
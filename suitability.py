@@ -1,19 +1,278 @@
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 from langchain_openai.chat_models.base import BaseChatOpenAI
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from google.cloud import firestore
 from prompts.company_info_prompt import company_info_prompt
 from utils.flatten_dict import flatten_dict
+from utils.result_cache import suitability_cache
+from utils.near_duplicate import near_duplicate_index
+from utils.scoring_client import analyze_remotely, ScoringServiceUnavailable
 from db.db import get_jobs
 from models.suitability_rating import SuitabilityRating
 from langchain_openai.chat_models.base import BaseChatOpenAI
 from langchain_openai import ChatOpenAI
-from utils.get_model import get_model, available_models
+from utils.get_model import get_structured_model, available_models
 import json
+import hashlib
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple
 from streamlit_js import st_js
 from db.db import get_filter_options, get_jobs
 
+# Jobs rendered at once in the job list
+JOB_WINDOW = 20
+
+# Seconds between job list refreshes, which pick up finished analyses
+ANALYSIS_POLL_INTERVAL = 1.0
+
+# Analyses one session may have on the shared pool at once. The rest wait in
+# the session's own queue, so one bulk analyze can't hold every worker.
+SESSION_ANALYSIS_LIMIT = 4
+
+@st.cache_resource
+def get_analysis_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for background suitability analysis, shared by all sessions"""
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="analyze")
+
+
+def job_key(job: Dict[str, str]) -> str:
+    return hashlib.sha256(f"{job['title']}\n{job['description']}".encode()).hexdigest()[:16]
+
+
+def analysis_key(job: Dict[str, str], model_name: str, prompt: str) -> Tuple[str, str, str]:
+    # Results are per prompt, so scores against an old prompt never show as current
+    return job_key(job), model_name, hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+def current_prompt() -> str:
+    return st.session_state.get('company_prompt', company_info_prompt)
+
+
+def analyze_job_with_model(model_name: str, prompt: str, job: Dict[str, str]) -> Tuple[SuitabilityRating, bool]:
+    """Rate one job with one model; returns (rating, reused from a near-duplicate).
+
+    Goes through the scoring service when SUITABILITY_API_URL is set, so the
+    UI shares its cache, connection pool and rate limits, and scores
+    in-process when the service is unset or unavailable.
+    """
+    try:
+        return analyze_remotely(model_name, prompt, job['title'], job['description'])
+    except ScoringServiceUnavailable:
+        return analyze_job_locally(model_name, prompt, job)
+
+
+def analyze_job_locally(model_name: str, prompt: str, job: Dict[str, str]) -> Tuple[SuitabilityRating, bool]:
+    cache_key = suitability_cache.make_key(model_name, prompt, job['title'], job['description'])
+    cached = suitability_cache.get(cache_key)
+    if cached is not None:
+        return cached, False
+
+    # A repost with small edits reuses the original's score
+    for original_title, original_description in near_duplicate_index.matches(job['title'], job['description']):
+        cached = suitability_cache.get(suitability_cache.make_key(model_name, prompt, original_title, original_description))
+        if cached is not None:
+            return cached, True
+
+    suitability_agent = get_structured_model(model_name, SuitabilityRating)
+
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"Job Title: {job['title']}\n\nJob Description: {job['description']}"}
+    ]
+
+    result = suitability_agent.invoke(messages)
+    suitability_cache.set(cache_key, result)
+    near_duplicate_index.add(job['title'], job['description'])
+    return result, False
+
+
+def start_analysis(jobs: List[Dict[str, str]], models: List[str], first: bool = False):
+    """Queue every (job, model) pair that has no result yet; `first` puts them ahead of earlier requests"""
+    prompt = current_prompt()
+    queued = st.session_state.analysis_queue
+    new = {}
+    for job in jobs:
+        for model_name in models:
+            key = analysis_key(job, model_name, prompt)
+            if key not in st.session_state.analysis_results and key not in st.session_state.analysis_futures:
+                new[key] = (model_name, prompt, job)
+    if first:
+        st.session_state.analysis_queue = {**new, **{key: item for key, item in queued.items() if key not in new}}
+    else:
+        queued.update((key, item) for key, item in new.items() if key not in queued)
+
+
+def collect_analysis() -> int:
+    """Move finished analyses into session state and submit queued ones; returns how many are pending"""
+    futures: Dict[Tuple[str, str, str], Future] = st.session_state.analysis_futures
+    for key, future in list(futures.items()):
+        if future.done():
+            error = future.exception()
+            st.session_state.analysis_results[key] = error if error is not None else future.result()
+            del futures[key]
+
+    queued = st.session_state.analysis_queue
+    executor = get_analysis_executor()
+    while queued and len(futures) < SESSION_ANALYSIS_LIMIT:
+        key = next(iter(queued))
+        model_name, prompt, job = queued.pop(key)
+        futures[key] = executor.submit(analyze_job_with_model, model_name, prompt, job)
+    return len(futures) + len(queued)
+
+
+def discard_analysis():
+    """Forget every result and pending analysis, e.g. after the prompt changed"""
+    for future in st.session_state.analysis_futures.values():
+        # Queued ones never start; running ones finish into the shared cache only
+        future.cancel()
+    st.session_state.analysis_futures = {}
+    st.session_state.analysis_queue = {}
+    st.session_state.analysis_results = {}
+
+
+def render_analysis(job: Dict[str, str], models: List[str]):
+    prompt = current_prompt()
+    for model_name in models:
+        key = analysis_key(job, model_name, prompt)
+        if key in st.session_state.analysis_futures:
+            st.caption(f"Analyzing with {model_name}...")
+            continue
+        if key in st.session_state.analysis_queue:
+            st.caption(f"Queued for {model_name}...")
+            continue
+        outcome = st.session_state.analysis_results.get(key)
+        if outcome is None:
+            continue
+        if isinstance(outcome, Exception):
+            st.error(f"{model_name} failed: {outcome}")
+            continue
+
+        result, near_duplicate = outcome
+        score = int(result.suitability_score)
+        color = "#ff6666" if score < 40 else "#ffaa66" if score < 70 else "#66bb66"
+        reused = " (near-duplicate of a scored job)" if near_duplicate else ""
+        st.markdown(f"""
+            <div style='padding: 10px; margin-bottom: 10px; background-color: {color}; border-radius: 5px;'>
+                <h4 style='color: white;'>{model_name} - Suitability Score: {score}/100{reused}</h4>
+                <p style='color: white;'>{result.reason}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+
+def shift_job_window(step: int):
+    st.session_state.job_window_start += step
+
+
+def load_more_jobs():
+    st.session_state.job_offset += 10
+    new_jobs = get_jobs(offset=st.session_state.job_offset, filters=st.session_state.filters)
+    st.session_state.loaded_jobs.extend(new_jobs)
+    # Move the window to the page holding the new jobs
+    st.session_state.job_window_start = max(0, len(st.session_state.loaded_jobs) - 1)
+
+
+def job_list(selected_models: List[str], ticking: bool = False):
+    """Windowed job list with analysis results.
+
+    Runs as a fragment: paging, analyzing and loading more only rerun this
+    panel. While analyses are pending it reruns itself every
+    ANALYSIS_POLL_INTERVAL seconds to show them as they finish, and stops
+    once they are all in.
+    """
+    pending = collect_analysis()
+    jobs = st.session_state.loaded_jobs
+    start = min(st.session_state.job_window_start, max(0, len(jobs) - 1))
+    start -= start % JOB_WINDOW
+    st.session_state.job_window_start = start
+    visible_jobs = jobs[start:start + JOB_WINDOW]
+
+    previous_col, info_col, next_col = st.columns([1, 3, 1])
+    with previous_col:
+        st.button("Previous", disabled=start == 0, use_container_width=True,
+                  on_click=shift_job_window, args=(-JOB_WINDOW,))
+    with next_col:
+        st.button("Next", disabled=start + JOB_WINDOW >= len(jobs), use_container_width=True,
+                  on_click=shift_job_window, args=(JOB_WINDOW,))
+    with info_col:
+        st.caption(f"Showing {start + 1 if jobs else 0}-{start + len(visible_jobs)} of {len(jobs)} loaded jobs")
+
+    if st.button("Analyze all visible jobs", disabled=not visible_jobs):
+        start_analysis(visible_jobs, selected_models)
+        pending = collect_analysis()
+    if pending:
+        st.caption(f"{pending} analyses running...")
+
+    for job in visible_jobs:
+        with st.container():
+            st.markdown(f"### {job['title']}")
+
+            # Descriptions are long; keep them collapsed
+            with st.expander("Description"):
+                st.write(job['description'])
+
+            if st.button(f"Analyze Suitability", key=f"analyze_{job_key(job)}"):
+                # A single job goes ahead of this session's bulk analyses
+                start_analysis([job], selected_models, first=True)
+                pending = collect_analysis()
+            render_analysis(job, selected_models)
+            st.markdown("---")
+
+    if start + JOB_WINDOW >= len(jobs):
+        with st.container(key='load_more_jobs_container'):
+          st.button("Load More Jobs", type="primary", use_container_width=True, on_click=load_more_jobs)
+
+    if ticking:
+        if not pending:
+            # Nothing left to pick up; the full rerun swaps in the idle list
+            st.rerun()
+    elif pending:
+        time.sleep(ANALYSIS_POLL_INTERVAL)
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # Drawn by a full app run, where only a full rerun is allowed; the
+            # ticking list takes over from there
+            st.rerun()
+
+
+idle_job_list = st.fragment(job_list)
+ticking_job_list = st.fragment(run_every=ANALYSIS_POLL_INTERVAL)(job_list)
+
+
+def render_job_list(selected_models: List[str]):
+    # st.rerun(scope="fragment") only works in a fragment's own reruns, so
+    # when a full app run finds analyses pending, a ticking fragment polls
+    if collect_analysis():
+        ticking_job_list(selected_models, ticking=True)
+    else:
+        idle_job_list(selected_models)
+
+
+@st.fragment
+def render_prompt_editor():
+    # Typing in the prompt only reruns this panel
+    edited_prompt = st.text_area(
+        "Edit Prompt", 
+        value=st.session_state.company_prompt, 
+        height=400,
+        key="prompt_textarea"
+    )
+    
+    # Add update button
+    if st.button("Update Prompt", type="primary"):
+        st.session_state.company_prompt = edited_prompt
+        # Scores against the old prompt no longer apply
+        discard_analysis()
+        # Store in localStorage using st_js
+        st_js(f"""
+            localStorage.setItem('companyPrompt', JSON.stringify({json.dumps(edited_prompt)}));
+            console.log('Prompt updated:', {json.dumps(edited_prompt)});
+        """)
+        st.success("Prompt updated successfully!")
+
 
 def create_streamlit_app():
     st.set_page_config(layout="wide")
@@ -21,14 +280,23 @@ def create_streamlit_app():
     # Initialize session state variables
     if 'job_offset' not in st.session_state:
         st.session_state.job_offset = 0
-    if 'loaded_jobs' not in st.session_state:
-        st.session_state.loaded_jobs = []
     if 'selected_model' not in st.session_state:
         st.session_state.selected_model = 'gpt-4o'
     if 'filters' not in st.session_state:
         st.session_state.filters = {}
+    # Fetched once per session; later pages come from "Load More Jobs"
+    if 'loaded_jobs' not in st.session_state:
+        st.session_state.loaded_jobs = get_jobs(offset=0, filters=st.session_state.filters)
+    if 'job_window_start' not in st.session_state:
+        st.session_state.job_window_start = 0
     if 'title_filter' not in st.session_state:
         st.session_state.title_filter = ''
+    if 'analysis_results' not in st.session_state:
+        st.session_state.analysis_results = {}
+    if 'analysis_futures' not in st.session_state:
+        st.session_state.analysis_futures = {}
+    if 'analysis_queue' not in st.session_state:
+        st.session_state.analysis_queue = {}
     
     st.markdown("""
         <style>
@@ -162,6 +430,7 @@ def create_streamlit_app():
             if st.session_state.title_filter:
                 st.session_state.filters['title'] = st.session_state.title_filter
             st.session_state.job_offset = 0  # Reset offset when applying new filters
+            st.session_state.job_window_start = 0
             st.session_state.loaded_jobs = get_jobs(offset=0, filters=st.session_state.filters)
             st.rerun()
 
@@ -176,87 +445,12 @@ def create_streamlit_app():
         if selected_models != st.session_state.selected_models:
             st.session_state.selected_models = selected_models
         
-        # Replace the disabled text area with an editable one and store in session state
-        edited_prompt = st.text_area(
-            "Edit Prompt", 
-            value=st.session_state.company_prompt, 
-            height=400,
-            key="prompt_textarea"
-        )
-        
-        # Add update button
-        if st.button("Update Prompt", type="primary"):
-            st.session_state.company_prompt = edited_prompt
-            # Store in localStorage using st_js
-            st_js(f"""
-                localStorage.setItem('companyPrompt', JSON.stringify({json.dumps(edited_prompt)}));
-                console.log('Prompt updated:', {json.dumps(edited_prompt)});
-            """)
-            st.success("Prompt updated successfully!")
+        render_prompt_editor()
     
     # Right column - Display jobs
     with col2:
         with st.container(key='jobs-container'):
-            
-            # Fetch new jobs and append to existing ones
-            new_jobs = get_jobs(offset=st.session_state.job_offset, filters=st.session_state.filters)
-            if not st.session_state.loaded_jobs or st.session_state.job_offset == 0:
-                st.session_state.loaded_jobs = new_jobs
-            
-            # Display all loaded jobs
-            for job in st.session_state.loaded_jobs:
-                with st.container():
-                    st.markdown(f"### {job['title']}")
-                    
-                    
-                    
-                    # Create a collapsible section for the full description
-                    st.write(job['description'])
-                    
-                    # Modify the analyze button section to handle multiple models
-                    if st.button(f"Analyze Suitability", key=f"analyze_{job['title']}"):
-                        with st.spinner("Analyzing job suitability..."):
-                            import asyncio
-                            import concurrent.futures
-                            
-                            def analyze_with_model(model_name):
-                                model = get_model(model_name)
-                                suitability_agent = model.with_structured_output(SuitabilityRating)
-                                
-                                # Get the prompt from session state, fallback to default if not set
-                                current_prompt = st.session_state.get('company_prompt', company_info_prompt)
-                                
-                                messages = [
-                                    {"role": "system", "content": current_prompt},
-                                    {"role": "user", "content": f"Job Title: {job['title']}\n\nJob Description: {job['description']}"}
-                                ]
-                                
-                                return model_name, suitability_agent.invoke(messages)
-                            
-                            # Use ThreadPoolExecutor for parallel execution
-                            with concurrent.futures.ThreadPoolExecutor() as executor:
-                                futures = [executor.submit(analyze_with_model, model) for model in selected_models]
-                                results = [future.result() for future in concurrent.futures.as_completed(futures)]
-                            
-                            # Display results for each model
-                            for model_name, result in results:
-                                score = int(result.suitability_score)
-                                color = "#ff6666" if score < 40 else "#ffaa66" if score < 70 else "#66bb66"
-                                st.markdown(f"""
-                                    <div style='padding: 10px; margin-bottom: 10px; background-color: {color}; border-radius: 5px;'>
-                                        <h4 style='color: white;'>{model_name} - Suitability Score: {score}/100</h4>
-                                        <p style='color: white;'>{result.reason}</p>
-                                    </div>
-                                """, unsafe_allow_html=True)
-                    st.markdown("---")
-                      
-            
-            with st.container(key='load_more_jobs_container'):
-              if st.button("Load More Jobs", type="primary", use_container_width=True):
-                  st.session_state.job_offset += 10
-                  new_jobs = get_jobs(offset=st.session_state.job_offset, filters=st.session_state.filters)
-                  st.session_state.loaded_jobs.extend(new_jobs)
-                  st.rerun()
+            render_job_list(selected_models)
 
 if __name__ == "__main__":
     create_streamlit_app()
@@ -1,13 +1,27 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from pydantic import BaseModel
-from typing import List
+from typing import Awaitable, Callable, Dict, List, Optional, Union
 from langchain_openai import ChatOpenAI
 from models.suitability_rating import SuitabilityRating
-from utils.get_model import get_model, available_models
+from models.token_usage import TokenUsage
+from utils.get_model import (
+    get_model, get_structured_model, get_provider, available_models, provider_concurrency,
+    default_deadline, model_deadlines, fallback_models, rate_limiters
+)
 from prompts.company_info_prompt import company_info_prompt
-import concurrent.futures
-from fastapi.responses import JSONResponse
+from utils.result_cache import suitability_cache
+from utils.near_duplicate import near_duplicate_index
+from utils.hedging import hedged_call, latency_tracker
+from utils.prefilter import get_index, job_text, default_prefilter_threshold
+from utils.timing import start_timings, span, record_span, child_timings
+from utils.metrics import CallbackMetric, render_metrics, http_requests, http_request_duration, http_in_flight
+import asyncio
+from collections import Counter
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json
+import time
 
 app = FastAPI()
 
@@ -20,91 +34,306 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+CallbackMetric('suitability_cache_hits_total', 'Suitability ratings served from the result cache', 'counter',
+               lambda: {(): suitability_cache.hits})
+CallbackMetric('suitability_cache_misses_total', 'Suitability lookups that missed the result cache', 'counter',
+               lambda: {(): suitability_cache.misses})
+CallbackMetric('provider_concurrency_limit', 'Current adaptive concurrency limit per provider', 'gauge',
+               lambda: {(provider,): limiter.snapshot()['concurrency_limit'] for provider, limiter in rate_limiters.items()},
+               ['provider'])
+CallbackMetric('provider_throttled_total', 'Rate-limited (429) responses per provider', 'counter',
+               lambda: {(provider,): limiter.snapshot()['throttled'] for provider, limiter in rate_limiters.items()},
+               ['provider'])
+
+class CascadeConfig(BaseModel):
+    # The screening model scores every job; the rest of the requested models
+    # only run when its score lands inside [lower, upper]
+    screening_model: str = 'gpt-4o-mini'
+    lower: int = 30
+    upper: int = 70
+
 class JobRequest(BaseModel):
     title: str
     description: str
     models: List[str] = available_models
     prompt: str = company_info_prompt
+    cascade: Optional[CascadeConfig] = None
+    # Jobs less similar than the threshold to the knowledge base skip the LLMs
+    prefilter: bool = False
+    prefilter_threshold: float = default_prefilter_threshold
+    # Include each model's timing breakdown in the response
+    debug: bool = False
+
+class BatchJob(BaseModel):
+    id: str
+    title: str
+    description: str
+
+class BatchJobRequest(BaseModel):
+    jobs: List[BatchJob]
+    models: List[str] = available_models
+    prompt: str = company_info_prompt
+    cascade: Optional[CascadeConfig] = None
+    prefilter: bool = False
+    prefilter_threshold: float = default_prefilter_threshold
 
 class SuitabilityResponse(BaseModel):
     model: str
-    score: int
+    score: Optional[int]  # None when the prefilter skipped the job
     reason: str
+    filtered: bool = False  # the prefilter judged the job a misfit, no model saw it
+    answered_by: Optional[str] = None  # differs from model when a fallback answered
+    usage: Optional[TokenUsage] = None  # None when served from cache or prefilter
+    timings: Optional[Dict[str, float]] = None  # ms per phase, only with debug=True
+    near_duplicate: bool = False  # score reused from an almost identical, already scored job
+
+class ModelError(BaseModel):
+    model: str
+    error: str  # this model failed on the job; the other models' results still count
+
+class BatchJobError(BaseModel):
+    error: str  # the job failed; the other jobs in the batch are unaffected
 
 class ProposalResponse(BaseModel):
     model: str
     proposal: str
 
-def analyze_with_model(model_name: str, prompt: str, job_title: str, job_description: str):
-    model = get_model(model_name)
-    suitability_agent = model.with_structured_output(SuitabilityRating)
-    
-    messages = [
-        {"role": "system", "content": prompt},
+def build_messages(prompt: str, job_title: str, job_description: str, model_name: Optional[str] = None):
+    # The large static prompt goes first so providers can cache it as a prefix.
+    # OpenAI and DeepSeek do that automatically; Anthropic needs a cache_control marker.
+    system_content = prompt
+    if model_name and get_provider(model_name) == 'anthropic':
+        system_content = [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+
+    return [
+        {"role": "system", "content": system_content},
         {"role": "user", "content": f"Job Title: {job_title}\n\nJob Description: {job_description}"}
     ]
-    
-    result = suitability_agent.invoke(messages)
-    return model_name, result
 
-def generate_proposal_with_model(model_name: str, prompt: str, job_title: str, job_description: str):
+async def analyze_with_model(model_name: str, prompt: str, job_title: str, job_description: str, debug: bool = False) -> SuitabilityResponse:
+    with span("cache"):
+        cached = await suitability_cache.aget(suitability_cache.make_key(model_name, prompt, job_title, job_description))
+    if cached is not None:
+        return to_suitability_response(model_name, cached)
+
+    # Reposts with small edits miss the exact cache; reuse the original's score
+    with span("near_duplicate"):
+        for original_title, original_description in await near_duplicate_index.amatches(job_title, job_description):
+            cached = await suitability_cache.aget(suitability_cache.make_key(model_name, prompt, original_title, original_description))
+            if cached is not None:
+                response = to_suitability_response(model_name, cached)
+                response.near_duplicate = True
+                return response
+
+    async def score(name: str):
+        with child_timings() as call_timings:
+            with span(f"model.{name}"):
+                # The structured model is (model bound to the schema) | (output parser);
+                # run the two steps separately so the parser gets its own span
+                suitability_agent = get_structured_model(name, SuitabilityRating)
+
+            raw = await suitability_agent.first.ainvoke(build_messages(prompt, job_title, job_description, name))
+            with span(f"parse.{name}"):
+                result = await suitability_agent.last.ainvoke(raw)
+
+        if result is None:
+            raise ValueError(f"{name} returned no suitability rating")
+        return raw, result, call_timings
+
+    answered_by, (raw, result, call_timings) = await hedged_call(
+        model_name,
+        score,
+        deadline=model_deadlines.get(model_name, default_deadline),
+        fallback=fallback_models.get(model_name),
+        hedge_after=latency_tracker.p95(model_name)
+    )
+    # Cache under the model that actually produced the rating
+    await suitability_cache.aset(suitability_cache.make_key(answered_by, prompt, job_title, job_description), result)
+    await near_duplicate_index.aadd(job_title, job_description)
+    response = to_suitability_response(model_name, result, answered_by)
+    response.usage = TokenUsage.from_message(raw)
+    if debug:
+        response.timings = call_timings.as_dict()
+    return response
+
+def prefilter_jobs(prompt: str, threshold: Optional[float], jobs) -> List[Optional[SuitabilityResponse]]:
+    """Score (title, description) pairs locally; misfits get a filtered response, the rest None"""
+    if threshold is None or not jobs:
+        return [None] * len(jobs)
+
+    similarities = get_index(prompt).score([job_text(title, description) for title, description in jobs])
+    return [
+        SuitabilityResponse(
+            model='prefilter',
+            score=None,
+            reason=f"Filtered locally: knowledge base similarity {similarity:.3f} is below {threshold}.",
+            filtered=True,
+            answered_by='prefilter'
+        ) if similarity < threshold else None
+        for similarity in similarities
+    ]
+
+async def analyze_with_cascade(
+    cascade: CascadeConfig,
+    models: List[str],
+    analyze: Callable[[str], Awaitable[Union[SuitabilityResponse, ModelError]]]
+) -> List[Union[SuitabilityResponse, ModelError]]:
+    screening = await analyze(cascade.screening_model)
+    # A failed screening gives nothing to escalate on
+    if isinstance(screening, ModelError) or not cascade.lower <= screening.score <= cascade.upper:
+        return [screening]
+
+    escalated = await asyncio.gather(*[
+        analyze(model) for model in models if model != cascade.screening_model
+    ])
+    return [screening, *escalated]
+
+def to_suitability_response(model_name: str, result: SuitabilityRating, answered_by: Optional[str] = None) -> SuitabilityResponse:
+    return SuitabilityResponse(
+        model=model_name,
+        score=int(result.suitability_score),
+        reason=result.reason,
+        answered_by=answered_by or model_name
+    )
+
+async def generate_proposal_with_model(model_name: str, prompt: str, job_title: str, job_description: str):
     model = get_model(model_name)
     proposal_agent = model
     
-    messages = [
-        {"role": "system", "content": prompt},
-        {"role": "user", "content": f"Job Title: {job_title}\n\nJob Description: {job_description}"}
-    ]
+    messages = build_messages(prompt, job_title, job_description, model_name)
     
-    result = proposal_agent.invoke(messages)
+    result = await proposal_agent.ainvoke(messages)
     return model_name, result
 
+async def stream_proposal_with_model(model_name: str, prompt: str, job_title: str, job_description: str):
+    model = get_model(model_name)
+    messages = build_messages(prompt, job_title, job_description, model_name)
+
+    async for chunk in model.astream(messages):
+        delta = chunk.text()
+        if delta:
+            yield delta
+
 @app.get("/available-models")
-async def available_models():
+async def list_available_models():
     return available_models
 
-@app.post("/analyze-job", response_model=List[SuitabilityResponse], methods=["POST", "OPTIONS"])
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return suitability_cache.stats()
+
+@app.post("/analyze-job", response_model=List[SuitabilityResponse])
 async def analyze_job(job: JobRequest):
-    if request.method == "OPTIONS":
-        return JSONResponse(status_code=204, headers={
-            "Access-Control-Allow-Origin": "http://localhost:3000",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization"
-        })
     try:
-        # Use ThreadPoolExecutor for parallel execution
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(analyze_with_model, model, job.prompt, job.title, job.description)
-                for model in job.models
-            ]
-            results = [future.result() for future in concurrent.futures.as_completed(futures)]
-        
-        # Format the response
-        return [
-            SuitabilityResponse(model=model_name, score=int(result.suitability_score), reason=result.reason)
-            for model_name, result in results
-        ]
+        filtered, = prefilter_jobs(job.prompt, job.prefilter_threshold if job.prefilter else None, [(job.title, job.description)])
+        if filtered:
+            return [filtered]
+
+        def analyze(model: str):
+            return analyze_with_model(model, job.prompt, job.title, job.description, job.debug)
+
+        if job.cascade:
+            return await analyze_with_cascade(job.cascade, job.models, analyze)
+
+        # Fan out to all models concurrently on the event loop
+        return await asyncio.gather(*[analyze(model) for model in job.models])
     
+    except asyncio.TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/generate-proposal", response_model=List[ProposalResponse], methods=["POST", "OPTIONS"])
+@app.post("/analyze-job/stream")
+async def stream_analysis(job: JobRequest):
+    """Emit one NDJSON line per model as soon as that model has scored the job"""
+    async def analyze_or_error(model: str) -> str:
+        try:
+            response = await analyze_with_model(model, job.prompt, job.title, job.description, job.debug)
+            return response.model_dump_json()
+        except Exception as e:
+            return json.dumps({"model": model, "error": str(e) or type(e).__name__})
+
+    async def lines():
+        filtered, = prefilter_jobs(job.prompt, job.prefilter_threshold if job.prefilter else None, [(job.title, job.description)])
+        if filtered:
+            yield filtered.model_dump_json() + "\n"
+            return
+
+        tasks = [asyncio.create_task(analyze_or_error(model)) for model in job.models]
+        try:
+            for next_line in asyncio.as_completed(tasks):
+                yield await next_line + "\n"
+        finally:
+            # Client went away or we're done; stop any model still running
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/analyze-jobs", response_model=Dict[str, Union[List[Union[SuitabilityResponse, ModelError]], BatchJobError]])
+async def analyze_jobs(batch: BatchJobRequest):
+    duplicates = sorted(job_id for job_id, count in Counter(job.id for job in batch.jobs).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=422, detail=f"Duplicate job ids: {', '.join(duplicates)}")
+    requested = set(batch.models) | ({batch.cascade.screening_model} if batch.cascade else set())
+    unknown = sorted(requested - set(available_models))
+    if unknown:
+        # Otherwise every job would fail the same way
+        raise HTTPException(status_code=422, detail=f"Unknown models: {', '.join(unknown)}. Available models: {available_models}")
+
+    try:
+        # One semaphore per provider so a slow provider can't starve the others
+        semaphores = {
+            provider: asyncio.Semaphore(limit)
+            for provider, limit in provider_concurrency.items()
+        }
+
+        async def analyze_bounded(job: BatchJob, model: str):
+            queued = time.perf_counter()
+            async with semaphores[get_provider(model)]:
+                record_span(f"batch_queue.{model}", time.perf_counter() - queued)
+                return await analyze_with_model(model, batch.prompt, job.title, job.description)
+
+        async def analyze_batch_job(job: BatchJob, filtered: Optional[SuitabilityResponse]):
+            if filtered:
+                return [filtered]
+
+            async def analyze(model: str):
+                try:
+                    return await analyze_bounded(job, model)
+                except Exception as e:
+                    return ModelError(model=model, error=str(e) or type(e).__name__)
+
+            if batch.cascade:
+                return await analyze_with_cascade(batch.cascade, batch.models, analyze)
+            return await asyncio.gather(*[analyze(model) for model in batch.models])
+
+        # Vectorized local pass over the whole batch before any LLM call
+        prefiltered = prefilter_jobs(batch.prompt, batch.prefilter_threshold if batch.prefilter else None, [(job.title, job.description) for job in batch.jobs])
+        # One failed job must not throw away the rest of the batch
+        scored = await asyncio.gather(*[
+            analyze_batch_job(job, filtered) for job, filtered in zip(batch.jobs, prefiltered)
+        ], return_exceptions=True)
+        return {
+            job.id: BatchJobError(error=str(responses) or type(responses).__name__) if isinstance(responses, Exception) else responses
+            for job, responses in zip(batch.jobs, scored)
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/generate-proposal", response_model=List[ProposalResponse])
 async def generate_proposal(job: JobRequest):
-    if request.method == "OPTIONS":
-        return JSONResponse(status_code=204, headers={
-            "Access-Control-Allow-Origin": "http://localhost:3000",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization"
-        })
     try:
-        # Use ThreadPoolExecutor for parallel execution
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [
-                executor.submit(generate_proposal_with_model, model, job.prompt, job.title, job.description)
-                for model in job.models
-            ]
-            results = [future.result() for future in concurrent.futures.as_completed(futures)]
+        # Fan out to all models concurrently on the event loop
+        results = await asyncio.gather(*[
+            generate_proposal_with_model(model, job.prompt, job.title, job.description)
+            for model in job.models
+        ])
         
         # Format the response
         return [
@@ -115,6 +344,36 @@ async def generate_proposal(job: JobRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-proposal/stream")
+async def stream_proposal(job: JobRequest):
+    """Stream proposal tokens from every model over one SSE response, tagged by model"""
+    queue = asyncio.Queue()
+
+    async def pump(model_name: str):
+        try:
+            async for delta in stream_proposal_with_model(model_name, job.prompt, job.title, job.description):
+                await queue.put({"model": model_name, "delta": delta})
+            await queue.put({"model": model_name, "done": True})
+        except Exception as e:
+            await queue.put({"model": model_name, "error": str(e)})
+
+    async def events():
+        tasks = [asyncio.create_task(pump(model)) for model in job.models]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if "delta" not in event:
+                    remaining -= 1
+                yield f"data: {json.dumps(event)}\n\n"
+            yield "event: end\ndata: {}\n\n"
+        finally:
+            # Client went away or we're done; stop any model still streaming
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.options("/{rest_of_path:path}")
 async def preflight_handler():
     return {
@@ -126,15 +385,49 @@ async def preflight_handler():
         }
     }
 
+def route_path(request: Request) -> str:
+    """The route template a request matches, e.g. /analyze-job, or 'unmatched'"""
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return 'unmatched'
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    started = time.monotonic()
+    # Label by route template, not raw URL, to keep cardinality bounded. The
+    # router hasn't run yet, so match the template here.
+    path = route_path(request)
+    http_in_flight.inc(path=path)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_in_flight.dec(path=path)
+        http_requests.inc(method=request.method, path=path, status=str(status))
+        http_request_duration.observe(time.monotonic() - started, method=request.method, path=path)
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    # Spans recorded anywhere below (including inside model callbacks) land here
+    timings = start_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    timings.add("total", time.perf_counter() - started)
+    response.headers["Server-Timing"] = timings.server_timing()
+    response.headers["Timing-Allow-Origin"] = "http://localhost:3000"
+    return response
+
 @app.middleware("http")
 async def add_cors_headers(request: Request, call_next):
-    print(f"Incoming request: {request.method} {request.url}")
-    print(f"Origin header: {request.headers.get('origin')}")
     response = await call_next(request)
     response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-    print("Response headers:", response.headers)
+    response.headers["Access-Control-Expose-Headers"] = "Server-Timing"
     return response
 
 if __name__ == "__main__":
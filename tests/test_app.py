@@ -0,0 +1,55 @@
+import os
+import uuid
+
+os.environ.setdefault("TAVILY_API_KEY", "test")
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from langgraph.checkpoint.memory import MemorySaver
+
+import app
+
+
+def make_agent(monkeypatch, checkpointer):
+    router = RunnableLambda(lambda _: app.RouterOutput(decision=app.RouteDecision.CONTINUE_CONVERSATION, reasoning="chat"))
+    monkeypatch.setattr(app, "get_structured_model", lambda *args, **kwargs: router)
+    monkeypatch.setattr(app, "get_model", lambda name: FakeListChatModel(responses=["unused"]))
+    model = FakeListChatModel(responses=["first answer", "second answer", "third answer"])
+    return app.Agent(model, [], system="You are helpful", checkpointer=checkpointer)
+
+
+def chat_turn(abot, config, history, prompt):
+    history.append({"role": "user", "content": prompt})
+    result = abot.graph.invoke(app.turn_input(abot, config, history, app.KnowledgeState()), config)
+    history.append({"role": "assistant", "content": result["messages"][-1].content})
+    return result
+
+
+def test_turns_on_one_thread_do_not_repeat_history(monkeypatch):
+    abot = make_agent(monkeypatch, MemorySaver())
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    history = []
+
+    counts = [len(chat_turn(abot, config, history, prompt)["messages"]) for prompt in ["hi", "we build apps", "thanks"]]
+
+    assert counts == [2, 4, 6]
+    assert [message.content for message in abot.graph.get_state(config).values["messages"]] == [
+        "hi", "first answer", "we build apps", "second answer", "thanks", "third answer"
+    ]
+
+
+def test_evicted_thread_is_rebuilt_from_history(monkeypatch):
+    checkpointer = MemorySaver()
+    abot = make_agent(monkeypatch, checkpointer)
+    conversations = app.Conversations(checkpointer, max_size=1)
+    config = {"configurable": {"thread_id": "evicted"}}
+    history = []
+
+    conversations.touch("evicted")
+    chat_turn(abot, config, history, "hi")
+    conversations.touch("newer")
+    assert not abot.graph.get_state(config).values
+
+    result = chat_turn(abot, config, history, "still there?")
+    assert [message.content for message in result["messages"]] == ["hi", "first answer", "still there?", "second answer"]
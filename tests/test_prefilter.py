@@ -0,0 +1,36 @@
+import json
+from pathlib import Path
+
+from prompts.company_info_prompt import company_info_prompt
+from utils.prefilter import KnowledgeBaseIndex, default_prefilter_threshold, get_index, job_text
+
+SEED_JOBS = Path(__file__).resolve().parent.parent / "bench" / "seed_jobs.jsonl"
+
+
+def load_seed_jobs():
+    with open(SEED_JOBS) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_default_threshold_keeps_every_seed_fit():
+    jobs = load_seed_jobs()
+    scores = get_index(company_info_prompt).score([job_text(job["title"], job["description"]) for job in jobs])
+
+    dropped = [job["title"] for job, score in zip(jobs, scores) if job["fit"] and score < default_prefilter_threshold]
+    assert any(job["fit"] for job in jobs)
+    assert dropped == []
+
+
+def test_default_threshold_drops_unrelated_jobs():
+    scores = get_index(company_info_prompt).score([
+        job_text("Dog walker needed", "Looking for someone to walk two labradors every weekday morning in Brooklyn."),
+        job_text("Proofread my novel", "Copy editing of an 80,000 word fantasy manuscript before submission to agents."),
+    ])
+
+    assert (scores < default_prefilter_threshold).all()
+
+
+def test_empty_knowledge_base_lets_everything_through():
+    index = KnowledgeBaseIndex([])
+
+    assert index.score(["anything at all"]).tolist() == [1.0]
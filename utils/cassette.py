@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+from pydantic import BaseModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# off: call the provider; record: call it and save every exchange;
+# replay: answer only from cassettes; auto: replay when recorded, else record
+cassette_mode = os.environ.get('LLM_CASSETTE_MODE', 'off')
+# Recordings hold full prompts and responses; the default directory is
+# git-ignored, so commit cassettes only deliberately (e.g. a reviewed fixture set)
+cassette_dir = Path(os.environ.get('LLM_CASSETTE_DIR', 'cassettes'))
+# Recorded latencies are multiplied by this on replay (0 answers immediately)
+latency_scale = float(os.environ.get('LLM_CASSETTE_LATENCY_SCALE', '1'))
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recording for a request"""
+
+
+def _jsonable(value):
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return value.model_json_schema()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return str(value)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_jsonable, sort_keys=True)
+
+
+def _message_key(message: BaseMessage) -> list:
+    # Ids differ from run to run, so only what the model actually sees counts
+    tool_calls = [(call['name'], call['args']) for call in getattr(message, 'tool_calls', None) or []]
+    return [message.type, message.content, tool_calls]
+
+
+def _serialize_message(message: BaseMessage) -> dict:
+    # Round-trip through JSON so pydantic values (e.g. additional_kwargs['parsed']) become plain dicts
+    return json.loads(_dumps(message_to_dict(message)))
+
+
+class CassetteMixin:
+    """Records or replays the provider calls of a chat model class.
+
+    Each exchange is one JSON file under cassette_dir/<model>/, named by a hash
+    of the messages and request options, holding the prompt, the response and
+    how long it took (per chunk when streamed).
+    """
+
+    def _cassette_path(self, messages: List[BaseMessage], stop, kwargs) -> Path:
+        model = getattr(self, 'model_name', None) or getattr(self, 'model', None)
+        request = [model, [_message_key(message) for message in messages], stop, kwargs]
+        key = hashlib.sha256(_dumps(request).encode()).hexdigest()
+        return cassette_dir / model / f"{key}.json"
+
+    def _load_cassette(self, path: Path) -> Optional[dict]:
+        if cassette_mode in ('replay', 'auto') and path.exists():
+            with open(path) as f:
+                return json.load(f)
+        if cassette_mode == 'replay':
+            raise CassetteMiss(f"No recording at {path}")
+        return None
+
+    def _save_cassette(self, path: Path, messages: List[BaseMessage], record: dict):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        record['messages'] = [_serialize_message(message) for message in messages]
+        # Concurrent recordings of the same request each write their own temp file
+        with tempfile.NamedTemporaryFile('w', dir=path.parent, suffix='.tmp', delete=False) as f:
+            f.write(_dumps(record))
+        os.replace(f.name, path)
+
+    @staticmethod
+    def _to_record(result: ChatResult, latency: float) -> dict:
+        return {
+            'latency': latency,
+            'generations': [
+                {'message': _serialize_message(generation.message), 'generation_info': generation.generation_info}
+                for generation in result.generations
+            ],
+            'llm_output': json.loads(_dumps(result.llm_output))
+        }
+
+    @staticmethod
+    def _from_record(record: dict) -> ChatResult:
+        generations = [
+            ChatGeneration(message=messages_from_dict([generation['message']])[0], generation_info=generation['generation_info'])
+            for generation in record['generations']
+        ]
+        return ChatResult(generations=generations, llm_output=record['llm_output'])
+
+    @staticmethod
+    def _to_chunk(recorded: dict) -> ChatGenerationChunk:
+        return ChatGenerationChunk(message=messages_from_dict([recorded['message']])[0], generation_info=recorded['generation_info'])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if cassette_mode == 'off':
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        path = self._cassette_path(messages, stop, kwargs)
+        record = self._load_cassette(path)
+        if record is not None:
+            time.sleep(record['latency'] * latency_scale)
+            return self._from_record(record)
+
+        started = time.perf_counter()
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._save_cassette(path, messages, self._to_record(result, time.perf_counter() - started))
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if cassette_mode == 'off':
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        path = self._cassette_path(messages, stop, kwargs)
+        record = self._load_cassette(path)
+        if record is not None:
+            await asyncio.sleep(record['latency'] * latency_scale)
+            return self._from_record(record)
+
+        started = time.perf_counter()
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._save_cassette(path, messages, self._to_record(result, time.perf_counter() - started))
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if cassette_mode == 'off':
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        path = self._cassette_path(messages, stop, dict(kwargs, stream=True))
+        record = self._load_cassette(path)
+        if record is not None:
+            started = time.perf_counter()
+            for recorded in record['chunks']:
+                time.sleep(max(0.0, started + recorded['offset'] * latency_scale - time.perf_counter()))
+                chunk = self._to_chunk(recorded)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append({'offset': time.perf_counter() - started, 'message': _serialize_message(chunk.message), 'generation_info': chunk.generation_info})
+            yield chunk
+        self._save_cassette(path, messages, {'latency': time.perf_counter() - started, 'chunks': chunks})
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if cassette_mode == 'off':
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        path = self._cassette_path(messages, stop, dict(kwargs, stream=True))
+        record = self._load_cassette(path)
+        if record is not None:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for recorded in record['chunks']:
+                await asyncio.sleep(max(0.0, started + recorded['offset'] * latency_scale - loop.time()))
+                chunk = self._to_chunk(recorded)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+
+        started = time.perf_counter()
+        chunks = []
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append({'offset': time.perf_counter() - started, 'message': _serialize_message(chunk.message), 'generation_info': chunk.generation_info})
+            yield chunk
+        self._save_cassette(path, messages, {'latency': time.perf_counter() - started, 'chunks': chunks})
+
+
+@lru_cache(maxsize=None)
+def with_cassette(cls):
+    """Subclass of a chat model class whose calls go through the cassette"""
+    return type(f"Cassette{cls.__name__}", (CassetteMixin, cls), {})
@@ -3,44 +3,137 @@ from langchain.callbacks.tracers import LangChainTracer
 from langchain.callbacks.manager import CallbackManager
 from langchain_anthropic import ChatAnthropic
 from langchain_openai.chat_models.base import BaseChatOpenAI
+from utils.rate_limiter import ProviderRateLimiter, RateLimitCallbackHandler, with_throttle_retry
+from utils.metrics import MetricsCallbackHandler
+from utils import cassette
+from functools import lru_cache
+import httpx
 import os
 import streamlit as st
 
 available_models = ['deepseek-chat', 'gpt-4o', 'gpt-4o-mini', 'claude-3-5-sonnet-20240620']
 
+# Models used internally by the onboarding agent, not offered for scoring
+agent_models = ['gpt-3.5-turbo']
+
+# Max number of concurrent calls per provider when scoring in bulk
+provider_concurrency = {
+  'openai': 8,
+  'deepseek': 4,
+  'anthropic': 4
+}
+
+# Provider quotas shared by every caller in the process
+provider_rate_limits = {
+  'openai': {'requests_per_minute': 500, 'tokens_per_minute': 200_000},
+  'deepseek': {'requests_per_minute': 300, 'tokens_per_minute': 200_000},
+  'anthropic': {'requests_per_minute': 50, 'tokens_per_minute': 40_000}
+}
+
+rate_limiters = {
+  provider: ProviderRateLimiter(max_concurrency=provider_concurrency[provider], **limits)
+  for provider, limits in provider_rate_limits.items()
+}
+
+# Per-call deadline in seconds, and the model raced against a slow one
+default_deadline = 60
+model_deadlines = {
+  'deepseek-chat': 45,
+  'claude-3-5-sonnet-20240620': 45
+}
+fallback_models = {
+  'deepseek-chat': 'gpt-4o-mini',
+  'claude-3-5-sonnet-20240620': 'gpt-4o',
+  'gpt-4o': 'gpt-4o-mini'
+}
+
 tracer = LangChainTracer(
     project_name="chatbot-upleads"
 )
 
+# Set LANGCHAIN_TRACING_V2=false to keep calls out of LangSmith (e.g. when benchmarking);
+# replayed cassettes are never traced
+tracing_enabled = os.environ.get('LANGCHAIN_TRACING_V2', 'true').lower() != 'false' and cassette.cassette_mode != 'replay'
+
+# Provider endpoints, overridable so the app can be pointed at a local stub server
+base_urls = {
+  'openai': os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+  'deepseek': os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com'),
+  'anthropic': os.environ.get('ANTHROPIC_BASE_URL', 'https://api.anthropic.com')
+}
+
+# Keep-alive pool shared by every call to the same OpenAI-compatible model
+http_limits = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60)
+
+def get_provider(name: str) -> str:
+  if 'gpt' in name:
+    return 'openai'
+  elif 'deepseek' in name:
+    return 'deepseek'
+  elif 'claude' in name:
+    return 'anthropic'
+  raise ValueError(f"Unknown provider for model {name}")
+
+def _secret(key: str) -> str:
+  """Read an API key from the environment, falling back to Streamlit secrets"""
+  if cassette.cassette_mode == 'replay':
+    # Replays never reach the provider, so no key is needed
+    return os.environ.get(key, 'replay')
+  return os.environ.get(key) or st.secrets[key]
+
+def _model_class(cls):
+  # The SDKs' own retries are off (max_retries=0): a 429 has to reach the rate
+  # limiter right away so it can back off, and the limiter retries the call
+  cls = with_throttle_retry(cls)
+  return cls if cassette.cassette_mode == 'off' else cassette.with_cassette(cls)
+
+
+@lru_cache(maxsize=None)
 def get_model(name: str):
-  if name not in available_models:
+  """Return the process-wide client for a model, building it on first use"""
+  if name not in available_models + agent_models:
     raise ValueError(f"Model {name} not found. Available models: {available_models}")
-  
+
+  rate_limiter = rate_limiters[get_provider(name)]
+  callbacks = [RateLimitCallbackHandler(rate_limiter, name), MetricsCallbackHandler(name)]
+  callback_manager = CallbackManager([tracer] + callbacks if tracing_enabled else callbacks)
+
   if 'gpt' in name:
-    return ChatOpenAI(
+    return _model_class(ChatOpenAI)(
       model=name,
       temperature=0,
-      callback_manager=CallbackManager([tracer]),
-      api_key=st.secrets["OPENAI_API_KEY"]
+      callback_manager=callback_manager,
+      rate_limiter=rate_limiter,
+      api_key=_secret("OPENAI_API_KEY"),
+      base_url=base_urls['openai'],
+      max_retries=0,
+      http_client=httpx.Client(limits=http_limits),
+      http_async_client=httpx.AsyncClient(limits=http_limits)
     )
   elif 'deepseek' in name:
-    return BaseChatOpenAI(
+    return _model_class(BaseChatOpenAI)(
       model=name,
-      openai_api_key=st.secrets['DEEPSEEK_API_KEY'],
-      openai_api_base="https://api.deepseek.com",
+      openai_api_key=_secret('DEEPSEEK_API_KEY'),
+      openai_api_base=base_urls['deepseek'],
       max_tokens=1024,
       temperature=0,
-      callback_manager=CallbackManager([tracer])
+      callback_manager=callback_manager,
+      rate_limiter=rate_limiter,
+      max_retries=0,
+      http_client=httpx.Client(limits=http_limits),
+      http_async_client=httpx.AsyncClient(limits=http_limits)
     )
   elif 'claude' in name:
-    return ChatAnthropic(
+    return _model_class(ChatAnthropic)(
       model=name,
       temperature=0,
       max_tokens=1024,
-      timeout=None,
-      max_retries=2,
-      api_key=st.secrets['ANTHROPIC_API_KEY'],
-      callback_manager=CallbackManager([tracer])
+      timeout=default_deadline,
+      max_retries=0,
+      api_key=_secret('ANTHROPIC_API_KEY'),
+      base_url=base_urls['anthropic'],
+      callback_manager=callback_manager,
+      rate_limiter=rate_limiter
     )
   # if name == 'deepseek':
   #   return BaseChatOpenAI(
@@ -56,3 +149,7 @@ def get_model(name: str):
   #           temperature=0
   #       )
 
+@lru_cache(maxsize=None)
+def get_structured_model(name: str, schema, **kwargs):
+  """Return the memoized structured-output runnable for a (model, schema) pair"""
+  return get_model(name).with_structured_output(schema, **kwargs)
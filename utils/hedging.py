@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional, Tuple, Any
+from utils.metrics import llm_hedges
+
+
+class LatencyTracker:
+    """Sliding window of call latencies per model, measured from when the call
+    got its rate limiter slot. Calls cancelled mid-flight count with the time
+    they had run, a lower bound, so losing to a hedge doesn't drag p95 down."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._samples[model].append(seconds)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples[model])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def p95(self, model: str) -> Optional[float]:
+        return self.percentile(model, 0.95)
+
+
+latency_tracker = LatencyTracker()
+
+# While the primary is still queued for a slot, check back this often
+SLOT_CHECK_EVERY = 0.05
+
+
+class Attempt:
+    """One call raced by hedged_call; the rate limiter marks when it gets a slot"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.slot_at: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - (self.slot_at or self.started_at)
+
+
+_attempt: ContextVar[Optional[Attempt]] = ContextVar("hedged_attempt", default=None)
+
+
+def mark_slot_acquired():
+    """Called by the rate limiter once the current call holds a slot"""
+    attempt = _attempt.get()
+    if attempt is not None and attempt.slot_at is None:
+        attempt.slot_at = time.monotonic()
+
+
+async def hedged_call(
+    model_name: str,
+    call: Callable[[str], Awaitable[Any]],
+    deadline: float,
+    fallback: Optional[str] = None,
+    hedge_after: Optional[float] = None
+) -> Tuple[str, Any]:
+    """Run call(model_name) under a deadline, racing call(fallback) against it.
+
+    The fallback starts once the primary has held its rate limiter slot for
+    hedge_after seconds, or straight away if the primary fails. Whichever
+    answers first wins and the other is cancelled. The deadline covers the
+    whole wait, queueing included. Returns (answering model, result).
+    """
+    async def timed(name: str, attempt: Attempt):
+        _attempt.set(attempt)
+        try:
+            result = await call(name)
+        except asyncio.CancelledError:
+            if attempt.slot_at is not None:
+                latency_tracker.record(name, attempt.elapsed())
+            raise
+        latency_tracker.record(name, attempt.elapsed())
+        return name, result
+
+    give_up_at = time.monotonic() + deadline
+    primary = Attempt()
+    pending = {asyncio.ensure_future(timed(model_name, primary))}
+    hedged = not fallback
+    error = None
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= give_up_at:
+                raise asyncio.TimeoutError(f"{model_name} did not answer within {deadline}s")
+
+            wake_at = give_up_at
+            if not hedged and hedge_after is not None:
+                if primary.slot_at is None:
+                    wake_at = min(wake_at, now + SLOT_CHECK_EVERY)
+                else:
+                    wake_at = min(wake_at, primary.slot_at + hedge_after)
+            if not hedged and (not pending or wake_at <= now):
+                llm_hedges.inc(model=model_name, fallback=fallback)
+                pending.add(asyncio.ensure_future(timed(fallback, Attempt())))
+                hedged = True
+                wake_at = give_up_at
+            if not pending:
+                raise error
+
+            done, pending = await asyncio.wait(pending, timeout=wake_at - now, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
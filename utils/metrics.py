@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Sequence, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, float('inf'))
+
+_registry = []
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), _format_value(value)
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class CallbackMetric(Metric):
+    """Metric whose values are read from fn() at scrape time, as {label values tuple: value}"""
+
+    def __init__(self, name: str, documentation: str, type: str, fn: Callable[[], Dict[Tuple, float]], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def samples(self):
+        for key, value in sorted(self.fn().items()):
+            yield self.name, _format_labels(self.labelnames, key), _format_value(value)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._counts = defaultdict(lambda: [0] * len(self.buckets))
+        self._sums = defaultdict(float)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts[key]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] += value
+
+    def samples(self):
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+        for key in sorted(counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts[key]):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"'), _format_value(cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), _format_value(sums[key])
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), _format_value(cumulative)
+
+
+def render_metrics() -> str:
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by route and status', ['method', 'path', 'status'])
+http_request_duration = Histogram('http_request_duration_seconds', 'HTTP request latency until response headers', ['method', 'path'])
+http_in_flight = Gauge('http_requests_in_flight', 'HTTP requests currently being handled', ['path'])
+
+llm_request_duration = Histogram('llm_request_duration_seconds', 'Model call latency', ['model'])
+llm_in_flight = Gauge('llm_requests_in_flight', 'Model calls currently running', ['model'])
+llm_input_tokens = Counter('llm_input_tokens_total', 'Input tokens sent to the model', ['model'])
+llm_cached_input_tokens = Counter('llm_cached_input_tokens_total', 'Input tokens served from the provider prompt cache', ['model'])
+llm_output_tokens = Counter('llm_output_tokens_total', 'Output tokens generated by the model', ['model'])
+llm_errors = Counter('llm_errors_total', 'Failed model calls by exception type', ['model', 'error'])
+llm_retries = Counter('llm_retries_total', 'Model calls retried after a 429', ['model'])
+llm_hedges = Counter('llm_hedges_total', 'Fallback requests raced against a slow or failed model', ['model', 'fallback'])
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records latency, tokens and errors for every call to one model"""
+
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        # A cancelled async call never reaches on_llm_end/on_llm_error, so also
+        # finish the run when the task that started it is done
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        done_callback = None
+        if task is not None:
+            done_callback = lambda _: self._finish(run_id)
+            task.add_done_callback(done_callback)
+
+        self._started[run_id] = (time.monotonic(), task, done_callback)
+        llm_in_flight.inc(model=self.model)
+
+    def _finish(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        started_at, task, done_callback = started
+        if task is not None:
+            task.remove_done_callback(done_callback)
+        llm_in_flight.dec(model=self.model)
+        llm_request_duration.observe(time.monotonic() - started_at, model=self.model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                llm_input_tokens.inc(usage.get('input_tokens', 0), model=self.model)
+                llm_cached_input_tokens.inc((usage.get('input_token_details') or {}).get('cache_read') or 0, model=self.model)
+                llm_output_tokens.inc(usage.get('output_tokens', 0), model=self.model)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+        llm_errors.inc(model=self.model, error=type(error).__name__)
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple
+import numpy as np
+from utils.prefilter import tokenize, job_text
+
+N_BITS = 64
+# Split into 8 bands of 8 bits: two fingerprints within 7 bits of each other
+# share at least one band exactly, so band lookups find every candidate
+N_BANDS = 8
+BAND_BITS = N_BITS // N_BANDS
+
+_BIT_POSITIONS = np.arange(N_BITS, dtype=np.uint64)
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the text's (count-weighted) tokens"""
+    counts = Counter(tokenize(text))
+    if not counts:
+        return 0
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'little') for token in counts],
+        dtype=np.uint64
+    )
+    weights = np.array(list(counts.values()), dtype=np.float64)
+    bits = ((hashes[:, None] >> _BIT_POSITIONS) & np.uint64(1)).astype(np.float64)
+    votes = weights @ (2 * bits - 1)
+    return sum(1 << int(position) for position in np.flatnonzero(votes > 0))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def jaccard(a: str, b: str) -> float:
+    """Jaccard similarity of the two texts' token sets"""
+    a_tokens, b_tokens = set(tokenize(a)), set(tokenize(b))
+    union = a_tokens | b_tokens
+    return len(a_tokens & b_tokens) / len(union) if union else 1.0
+
+
+def _bands(fingerprint: int) -> List[int]:
+    # The band index goes in the high bits so equal values in different bands don't match
+    mask = (1 << BAND_BITS) - 1
+    return [(band << BAND_BITS) | ((fingerprint >> (band * BAND_BITS)) & mask) for band in range(N_BANDS)]
+
+
+def _to_signed(fingerprint: int) -> int:
+    # SQLite integers are signed 64-bit
+    return fingerprint - (1 << N_BITS) if fingerprint >= 1 << (N_BITS - 1) else fingerprint
+
+
+class NearDuplicateIndex:
+    """SimHash fingerprints of scored jobs, banded for Hamming-distance lookups.
+
+    Lives in SQLite so every process (API, app, worker) sees the jobs the
+    others have scored. A one-word edit moves a SimHash by up to about 10
+    bits, while distinct jobs sit 20+ bits apart, so the Hamming radius is
+    kept generous and every candidate is confirmed by the Jaccard similarity
+    of the token sets (one-word edits stay near 0.9, distinct jobs below 0.1).
+    Jobs with fewer than `min_tokens` tokens are neither indexed nor matched.
+    """
+
+    # Every model scoring the same job asks for its matches within moments of
+    # the others, so lookups are remembered briefly
+    MATCHES_TTL = 30
+    MATCHES_CACHE_SIZE = 1024
+
+    def __init__(
+        self,
+        path: str,
+        max_distance: int = 6,
+        min_jaccard: float = 0.8,
+        min_tokens: int = 20,
+        ttl: float = 7 * 24 * 3600,
+        enabled: bool = True
+    ):
+        if max_distance >= N_BANDS:
+            raise ValueError(f"max_distance must be below {N_BANDS} for the band lookup to be exact")
+        self.max_distance = max_distance
+        self.min_jaccard = min_jaccard
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._recent_matches: "OrderedDict[str, tuple]" = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_fingerprints "
+            "(key TEXT PRIMARY KEY, fingerprint INTEGER NOT NULL, title TEXT NOT NULL, description TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS job_fingerprint_bands (band INTEGER NOT NULL, key TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS job_fingerprint_bands_band ON job_fingerprint_bands (band)")
+        expired = "SELECT key FROM job_fingerprints WHERE created_at < ?"
+        cutoff = time.time() - ttl
+        self._db.execute(f"DELETE FROM job_fingerprint_bands WHERE key IN ({expired})", (cutoff,))
+        self._db.execute("DELETE FROM job_fingerprints WHERE created_at < ?", (cutoff,))
+        self._db.commit()
+
+    @staticmethod
+    def _key(title: str, description: str) -> str:
+        return hashlib.sha256(job_text(title, description).encode()).hexdigest()
+
+    def _fingerprint(self, title: str, description: str) -> Optional[int]:
+        """SimHash of the job, or None when it is too short to match reliably"""
+        text = job_text(title, description)
+        if len(tokenize(text)) < self.min_tokens:
+            return None
+        return simhash(text)
+
+    def add(self, title: str, description: str):
+        if not self.enabled:
+            return
+        fingerprint = self._fingerprint(title, description)
+        if fingerprint is None:
+            return
+        key = self._key(title, description)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO job_fingerprints (key, fingerprint, title, description, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, _to_signed(fingerprint), title, description, time.time())
+            )
+            if cursor.rowcount:
+                self._db.executemany(
+                    "INSERT INTO job_fingerprint_bands (band, key) VALUES (?, ?)",
+                    [(band, key) for band in _bands(fingerprint)]
+                )
+            self._db.commit()
+
+    def matches(self, title: str, description: str) -> List[Tuple[str, str]]:
+        """(title, description) of the other indexed jobs that are near duplicates, nearest first"""
+        if not self.enabled:
+            return []
+        key = self._key(title, description)
+        with self._lock:
+            recent = self._recent_matches.get(key)
+            if recent is not None and time.monotonic() - recent[0] < self.MATCHES_TTL:
+                return recent[1]
+
+        found = self._find_matches(key, title, description)
+        with self._lock:
+            self._recent_matches[key] = (time.monotonic(), found)
+            self._recent_matches.move_to_end(key)
+            while len(self._recent_matches) > self.MATCHES_CACHE_SIZE:
+                self._recent_matches.popitem(last=False)
+        return found
+
+    async def aadd(self, title: str, description: str):
+        """add() for the event loop; SQLite can wait on another process's lock, so it runs in a thread"""
+        await asyncio.to_thread(self.add, title, description)
+
+    async def amatches(self, title: str, description: str) -> List[Tuple[str, str]]:
+        """matches() for the event loop, run in a thread for the same reason as aadd()"""
+        return await asyncio.to_thread(self.matches, title, description)
+
+    def _find_matches(self, key: str, title: str, description: str) -> List[Tuple[str, str]]:
+        fingerprint = self._fingerprint(title, description)
+        if fingerprint is None:
+            return []
+        bands = _bands(fingerprint)
+        with self._lock:
+            # Band candidates can be many; only the few real matches need their text
+            rows = self._db.execute(
+                "SELECT key, fingerprint FROM job_fingerprints WHERE key IN "
+                f"(SELECT key FROM job_fingerprint_bands WHERE band IN ({','.join('?' * len(bands))})) AND key != ? AND created_at >= ?",
+                (*bands, key, time.time() - self.ttl)
+            ).fetchall()
+            distances = {
+                stored_key: distance for stored_key, stored in rows
+                if (distance := hamming_distance(fingerprint, stored % (1 << N_BITS))) <= self.max_distance
+            }
+            if not distances:
+                return []
+            texts = self._db.execute(
+                f"SELECT key, title, description FROM job_fingerprints WHERE key IN ({','.join('?' * len(distances))})",
+                tuple(distances)
+            ).fetchall()
+
+        # The fingerprint radius is wide, so confirm each candidate on the text itself
+        text = job_text(title, description)
+        texts = [row for row in texts if jaccard(text, job_text(row[1], row[2])) >= self.min_jaccard]
+        texts.sort(key=lambda row: distances[row[0]])
+        return [(stored_title, stored_description) for _, stored_title, stored_description in texts]
+
+
+near_duplicate_index = NearDuplicateIndex(
+    os.environ.get("SUITABILITY_CACHE_PATH", "suitability_cache.db"),
+    max_distance=int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", 6)),
+    min_jaccard=float(os.environ.get("NEAR_DUPLICATE_MIN_JACCARD", 0.8)),
+    min_tokens=int(os.environ.get("NEAR_DUPLICATE_MIN_TOKENS", 20)),
+    ttl=float(os.environ.get("SUITABILITY_CACHE_TTL", 7 * 24 * 3600)),
+    enabled=os.environ.get("NEAR_DUPLICATE_LOOKUP", "on").lower() != "off"
+)
@@ -0,0 +1,98 @@
+import re
+import zlib
+from functools import lru_cache
+from typing import List
+import numpy as np
+
+# Jobs whose best section similarity is below this never reach an LLM. Lexical
+# similarity hardly separates fits from misfits (on bench/seed_jobs.jsonl the
+# fits score 0.039-0.096 and so do the misfits), so it only drops jobs that
+# share next to no vocabulary with the knowledge base
+default_prefilter_threshold = 0.02
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do for from has have i if in into is it its
+looking me my need needs not of on or our should so that the their them there these
+they this to us was we were what when which who will with would you your
+""".split())
+
+
+@lru_cache(maxsize=65536)
+def _bucket(token: str, n_features: int) -> int:
+    return zlib.crc32(token.encode()) % n_features
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def knowledge_base_sections(prompt: str) -> List[str]:
+    """Split the knowledge base part of a prompt into its headed sections"""
+    if "# Knowledge Base" in prompt:
+        prompt = prompt.split("# Knowledge Base", 1)[1]
+    sections = re.split(r"\n(?=#+ )", prompt)
+    # "Projects We Avoid" describes misfits, so it must not make a job look relevant
+    return [section for section in sections if section.strip() and 'avoid' not in section.split('\n', 1)[0].lower()]
+
+
+class KnowledgeBaseIndex:
+    """Hashed TF-IDF vectors of the knowledge base sections.
+
+    Jobs are scored in one vectorized pass by their best cosine similarity to
+    any section.
+    """
+
+    def __init__(self, sections: List[str], n_features: int = 2 ** 16):
+        self.n_features = n_features
+        docs, buckets, counts = self._term_counts(sections)
+        # Nothing to compare jobs against, so score() lets every job through
+        self.empty = not len(docs)
+
+        document_frequency = np.bincount(buckets, minlength=n_features)
+        self.idf = (np.log((1 + len(sections)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        weights = (1 + np.log(counts)) * self.idf[buckets]
+        self.sections = np.zeros((len(sections), n_features), dtype=np.float32)
+        self.sections[docs, buckets] = weights
+        norms = np.linalg.norm(self.sections, axis=1, keepdims=True)
+        self.sections /= np.where(norms == 0, 1, norms)
+
+    def _term_counts(self, texts: List[str]):
+        """Return (doc index, feature bucket, count) for every distinct term of every text"""
+        docs, buckets = [], []
+        for index, text in enumerate(texts):
+            tokens = tokenize(text)
+            docs.extend([index] * len(tokens))
+            buckets.extend(_bucket(token, self.n_features) for token in tokens)
+
+        keys = np.asarray(docs, dtype=np.int64) * self.n_features + np.asarray(buckets, dtype=np.int64)
+        keys, counts = np.unique(keys, return_counts=True)
+        return keys // self.n_features, keys % self.n_features, counts
+
+    def score(self, texts: List[str]) -> np.ndarray:
+        """Best section cosine similarity for each text, in [0, 1] (all 1 for an empty index)"""
+        if self.empty:
+            return np.ones(len(texts), dtype=np.float32)
+        scores = np.zeros(len(texts), dtype=np.float32)
+        docs, buckets, counts = self._term_counts(texts)
+        if not len(docs):
+            return scores
+
+        weights = (1 + np.log(counts)) * self.idf[buckets]
+        norms = np.sqrt(np.bincount(docs, weights=weights ** 2, minlength=len(texts)))
+
+        # Terms are sorted by doc, so each doc's terms form one contiguous run
+        starts = np.flatnonzero(np.r_[True, docs[1:] != docs[:-1]])
+        dots = np.add.reduceat(self.sections[:, buckets] * weights, starts, axis=1)
+        scores[docs[starts]] = dots.max(axis=0) / norms[docs[starts]]
+        return scores
+
+
+@lru_cache(maxsize=8)
+def get_index(prompt: str) -> KnowledgeBaseIndex:
+    return KnowledgeBaseIndex(knowledge_base_sections(prompt))
+
+
+def job_text(title: str, description: str) -> str:
+    return f"{title}\n{description}"
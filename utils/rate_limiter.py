@@ -0,0 +1,292 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+from utils.timing import record_span
+from utils.metrics import llm_retries
+from utils.hedging import mark_slot_acquired
+
+class CallTiming:
+    """Per-call scratchpad shared between the callback handler (which sees the
+    run start/end) and the limiter (which sees when the call got a slot)"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started_at = time.monotonic()
+        self.acquired_at: Optional[float] = None
+        self.released = False
+        self.task: Optional[asyncio.Task] = None
+        self.done_callback = None
+
+
+_call_timing: ContextVar[Optional[CallTiming]] = ContextVar("call_timing", default=None)
+
+
+class ProviderRateLimiter(BaseRateLimiter):
+    """Token buckets for requests/min and tokens/min plus an AIMD concurrency limit.
+
+    Tokens are charged after the fact from the reported usage, so a burst can
+    overdraw the token bucket; new calls then wait until it refills.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        latency_target: float = 30.0,
+        check_every: float = 0.05
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.check_every = check_every
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self._consecutive_throttles = 0
+        self._paused_until = 0.0
+        self._request_tokens = float(requests_per_minute)
+        self._token_budget = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_tokens = min(self.requests_per_minute, self._request_tokens + elapsed * self.requests_per_minute / 60)
+        self._token_budget = min(self.tokens_per_minute, self._token_budget + elapsed * self.tokens_per_minute / 60)
+
+    def _try_acquire(self) -> bool:
+        with self._lock:
+            self._refill()
+            if time.monotonic() < self._paused_until:
+                return False
+            if self.in_flight >= int(self.concurrency_limit) or self._request_tokens < 1 or self._token_budget <= 0:
+                return False
+            self._request_tokens -= 1
+            self.in_flight += 1
+
+        timing = _call_timing.get()
+        if timing is not None:
+            timing.acquired_at = time.monotonic()
+        mark_slot_acquired()
+        return True
+
+    def _record_queue_time(self):
+        timing = _call_timing.get()
+        if timing is not None:
+            record_span(f"queue.{timing.model}", timing.acquired_at - timing.started_at)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        while not self._try_acquire():
+            if not blocking:
+                return False
+            time.sleep(self.check_every)
+        self._record_queue_time()
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        while not self._try_acquire():
+            if not blocking:
+                return False
+            await asyncio.sleep(self.check_every)
+        self._record_queue_time()
+
+        # A cancelled ainvoke never reaches on_llm_end/on_llm_error, so tie the
+        # slot to the task that holds it as well
+        timing = _call_timing.get()
+        task = asyncio.current_task()
+        if timing is not None and task is not None:
+            timing.task = task
+            timing.done_callback = lambda _: self.release(timing)
+            task.add_done_callback(timing.done_callback)
+        return True
+
+    def throttle(self, retry_after: Optional[float] = None) -> float:
+        """Record a 429: halve the concurrency limit and pause new calls.
+
+        The pause is the provider's Retry-After when given, else an
+        exponential backoff with jitter. Returns how long it lasts.
+        """
+        with self._lock:
+            self.throttled += 1
+            # Calls already in flight when the provider started throttling also
+            # get 429s; they belong to the same episode, so decrease once per pause
+            if time.monotonic() >= self._paused_until:
+                self._consecutive_throttles += 1
+                # Multiplicative decrease on 429s...
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit / 2)
+            if retry_after is None:
+                retry_after = min(60.0, 2 ** (self._consecutive_throttles - 1)) * random.uniform(0.5, 1.0)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return self._paused_until - time.monotonic()
+
+    def release(self, timing: CallTiming, latency: Optional[float] = None, tokens: int = 0):
+        """Free the call's slot (once) and adapt the concurrency limit to how it went"""
+        with self._lock:
+            if not timing.released:
+                timing.released = True
+                self.in_flight = max(0, self.in_flight - 1)
+                if timing.task is not None:
+                    timing.task.remove_done_callback(timing.done_callback)
+            self._token_budget -= tokens
+            if latency is not None:
+                self._consecutive_throttles = 0
+            if latency is not None and latency > self.latency_target:
+                # ...a gentler one when the provider is slowing down...
+                self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * 0.9)
+            elif latency is not None:
+                # ...and additive increase (about +1 per window of successes)
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {
+                'in_flight': self.in_flight,
+                'concurrency_limit': int(self.concurrency_limit),
+                'request_tokens': int(self._request_tokens),
+                'token_budget': int(self._token_budget),
+                'throttled': self.throttled
+            }
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    return getattr(error, 'status_code', None) == 429 or type(error).__name__ == 'RateLimitError'
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+# Calls a 429 is retried at most this many times, each after the limiter's pause
+THROTTLE_RETRIES = 3
+
+
+class ThrottleRetryMixin:
+    """Retries a chat model's 429s through its ProviderRateLimiter.
+
+    The provider SDKs are built with max_retries=0, so every 429 reaches the
+    limiter at once: it halves the concurrency limit and pauses the provider,
+    and the call is retried (in the slot it holds) when the pause ends.
+    """
+
+    def _throttled(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up"""
+        if not is_rate_limit_error(error) or not isinstance(self.rate_limiter, ProviderRateLimiter):
+            return None
+        pause = self.rate_limiter.throttle(_retry_after(error))
+        if attempt >= THROTTLE_RETRIES:
+            return None
+        llm_retries.inc(model=getattr(self, 'model_name', None) or getattr(self, 'model', None))
+        return pause
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        for attempt in range(THROTTLE_RETRIES + 1):
+            try:
+                return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                pause = self._throttled(e, attempt)
+                if pause is None:
+                    raise
+                time.sleep(pause)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        for attempt in range(THROTTLE_RETRIES + 1):
+            try:
+                return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                pause = self._throttled(e, attempt)
+                if pause is None:
+                    raise
+                await asyncio.sleep(pause)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for attempt in range(THROTTLE_RETRIES + 1):
+            started = False
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                # Once chunks went out, a retry would repeat them
+                pause = None if started else self._throttled(e, attempt)
+                if pause is None:
+                    raise
+                time.sleep(pause)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for attempt in range(THROTTLE_RETRIES + 1):
+            started = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                pause = None if started else self._throttled(e, attempt)
+                if pause is None:
+                    raise
+                await asyncio.sleep(pause)
+
+
+@lru_cache(maxsize=None)
+def with_throttle_retry(cls):
+    """Subclass of a chat model class whose 429s are retried through its rate limiter"""
+    return type(f"ThrottleRetry{cls.__name__}", (ThrottleRetryMixin, cls), {})
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Feeds observed latency, token usage and 429s back into a ProviderRateLimiter"""
+
+    run_inline = True
+
+    def __init__(self, limiter: ProviderRateLimiter, model: str):
+        self.limiter = limiter
+        self.model = model
+        # Weak so runs that are cancelled (and never end) don't pile up
+        self._runs = weakref.WeakValueDictionary()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        timing = CallTiming(self.model)
+        self._runs[run_id] = timing
+        _call_timing.set(timing)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        timing = self._runs.pop(run_id, None)
+        if timing is None or timing.acquired_at is None:
+            return
+
+        latency = time.monotonic() - timing.acquired_at
+        record_span(f"provider.{self.model}", latency)
+
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                tokens += usage.get('total_tokens', 0)
+        self.limiter.release(timing, latency=latency, tokens=tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        timing = self._runs.pop(run_id, None)
+        if timing is None or timing.acquired_at is None:
+            return
+        record_span(f"provider.{self.model}", time.monotonic() - timing.acquired_at)
+        # 429s were already reported by ThrottleRetryMixin as they happened
+        self.limiter.release(timing)
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from models.suitability_rating import SuitabilityRating
+
+
+class SuitabilityCache:
+    """Two-tier (in-memory LRU + SQLite) cache of suitability ratings with TTL"""
+
+    def __init__(self, path: str, max_entries: int = 2048, ttl: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # _lock guards the LRU and counters, _db_lock the connection, so a
+        # lookup served from memory never waits on SQLite
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # The API, the Streamlit app and the pre-scoring worker can share one file
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS suitability_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("DELETE FROM suitability_cache WHERE created_at < ?", (time.time() - ttl,))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, title: str, description: str) -> str:
+        payload = json.dumps([model, prompt, title, description])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _from_memory(self, key: str):
+        with self._lock:
+            return self._memory.get(key)
+
+    def _load(self, key: str):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM suitability_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[1], SuitabilityRating.model_validate_json(row[0])) if row is not None else None
+
+    def _settle(self, key: str, entry) -> Tuple[Optional[SuitabilityRating], bool]:
+        """Count the lookup; returns (rating or None, whether the stored entry expired)"""
+        with self._lock:
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None:
+                    self._memory.pop(key, None)
+                self.misses += 1
+                return None, entry is not None
+
+            self._remember(key, entry)
+            self.hits += 1
+            return entry[1], False
+
+    def get(self, key: str) -> Optional[SuitabilityRating]:
+        entry = self._from_memory(key)
+        if entry is None:
+            entry = self._load(key)
+        rating, expired = self._settle(key, entry)
+        if expired:
+            self._delete(key)
+        return rating
+
+    def contains(self, key: str) -> bool:
+        """Whether a fresh rating is cached, without counting a hit or miss"""
+        entry = self._from_memory(key) or self._load(key)
+        return entry is not None and time.time() - entry[0] <= self.ttl
+
+    async def aget(self, key: str) -> Optional[SuitabilityRating]:
+        """get() for the event loop: only the in-memory LRU is read inline.
+
+        SQLite waits up to 30 s for a lock another process (worker, app)
+        holds, so it runs in a thread.
+        """
+        entry = self._from_memory(key)
+        if entry is None:
+            entry = await asyncio.to_thread(self._load, key)
+        rating, expired = self._settle(key, entry)
+        if expired:
+            await asyncio.to_thread(self._delete, key)
+        return rating
+
+    def set(self, key: str, rating: SuitabilityRating):
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, (created_at, rating))
+        self._store(key, rating, created_at)
+
+    async def aset(self, key: str, rating: SuitabilityRating):
+        """set() for the event loop; the SQLite write runs in a thread"""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, (created_at, rating))
+        await asyncio.to_thread(self._store, key, rating, created_at)
+
+    def _store(self, key: str, rating: SuitabilityRating, created_at: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO suitability_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, rating.model_dump_json(), created_at)
+            )
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'memory_entries': len(self._memory)
+            }
+
+    def _remember(self, key: str, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _delete(self, key: str):
+        with self._db_lock:
+            self._db.execute("DELETE FROM suitability_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+
+suitability_cache = SuitabilityCache(
+    os.environ.get("SUITABILITY_CACHE_PATH", "suitability_cache.db"),
+    ttl=float(os.environ.get("SUITABILITY_CACHE_TTL", 7 * 24 * 3600))
+)
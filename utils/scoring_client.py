@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Optional, Tuple
+from models.suitability_rating import SuitabilityRating
+
+# Base URL of suitability_api; unset means the UI scores in-process
+SUITABILITY_API_URL = os.environ.get("SUITABILITY_API_URL")
+
+# (connect, read) timeouts; the read one covers the API's own model deadlines
+REQUEST_TIMEOUT = (3.05, 120)
+
+# How long to stop trying the service after it failed to answer
+RETRY_AFTER = 30
+
+
+class ScoringServiceUnavailable(Exception):
+    """The scoring service could not be reached or is down; score in-process instead"""
+
+
+def _create_session() -> requests.Session:
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+session = _create_session()
+
+_down_until = 0.0
+_down_lock = threading.Lock()
+
+
+def _mark_down():
+    global _down_until
+    with _down_lock:
+        _down_until = time.monotonic() + RETRY_AFTER
+
+
+def analyze_remotely(model_name: str, prompt: str, title: str, description: str, api_url: Optional[str] = None) -> Tuple[SuitabilityRating, bool]:
+    """Score one job with one model through the service; returns (rating, near-duplicate hit)"""
+    api_url = api_url or SUITABILITY_API_URL
+    if not api_url or time.monotonic() < _down_until:
+        raise ScoringServiceUnavailable(api_url)
+
+    try:
+        response = session.post(
+            f"{api_url}/analyze-job",
+            json={'title': title, 'description': description, 'models': [model_name], 'prompt': prompt},
+            timeout=REQUEST_TIMEOUT
+        )
+    except requests.ConnectionError as e:
+        # Includes ConnectTimeout. A ReadTimeout is not caught: the service
+        # took the job and is still working on it, so it counts as this job's error
+        _mark_down()
+        raise ScoringServiceUnavailable(str(e)) from e
+    # Only these mean the service itself is down. Any other error (a model
+    # failure surfaces as 500, a deadline as 504) belongs to this job: scoring
+    # it in-process would just retry the same failing provider.
+    if response.status_code in (502, 503):
+        _mark_down()
+        raise ScoringServiceUnavailable(f"{response.status_code}: {response.text}")
+    if response.status_code >= 400:
+        raise requests.HTTPError(f"{response.status_code}: {response.text}", response=response)
+
+    result = response.json()[0]
+    rating = SuitabilityRating(suitability_score=str(result['score']), reason=result['reason'])
+    return rating, result.get('near_duplicate', False)
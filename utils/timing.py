@@ -0,0 +1,72 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class Timings:
+    """Accumulated span durations for one request (or one call within it).
+
+    Spans are summed by name. A child forwards everything it records to its
+    parent, so a model call can report its own breakdown while the request
+    still sees the whole picture.
+    """
+
+    def __init__(self, parent: Optional["Timings"] = None):
+        self.parent = parent
+        self.spans: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.add(name, seconds)
+
+    def total(self, prefix: str) -> float:
+        with self._lock:
+            return sum(seconds for name, seconds in self.spans.items() if name.startswith(prefix))
+
+    def as_dict(self) -> Dict[str, float]:
+        """Span durations in milliseconds"""
+        with self._lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self.spans.items()}
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+_current_timings: ContextVar[Optional[Timings]] = ContextVar("current_timings", default=None)
+
+
+def start_timings() -> Timings:
+    timings = Timings()
+    _current_timings.set(timings)
+    return timings
+
+
+def record_span(name: str, seconds: float):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+@contextmanager
+def child_timings():
+    """Collect the spans recorded inside the block separately (and still forward them up)"""
+    timings = Timings(parent=_current_timings.get())
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
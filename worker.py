@@ -0,0 +1,172 @@
+"""Background worker that scores new job postings before anyone asks.
+
+Every poll it walks the newest jobs from the jobs backend, scores the ones
+that have no cached rating yet through suitability_api.analyze_with_model,
+and stops once it reaches a run of jobs that are already scored. Ratings
+land in the shared result cache (SQLite), which is where the API and the
+Streamlit app look first, so they serve them without calling a model.
+
+    python worker.py --interval 300 --concurrency 8
+    python worker.py --once --models gpt-4o-mini,deepseek-chat
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from prompts.company_info_prompt import company_info_prompt
+from suitability_api import analyze_with_model
+from utils.get_model import available_models
+from utils.result_cache import suitability_cache
+from db.db import iter_jobs
+
+logger = logging.getLogger("worker")
+
+
+class FallbackAnswers:
+    """(job, model) pairs that a fallback model answered for.
+
+    Those ratings are cached under the fallback's name, so the cache alone would
+    report the job unscored on every poll. Entries expire with the result cache
+    and the oldest are dropped beyond max_size.
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float = suitability_cache.ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+
+    def __contains__(self, key: Tuple[int, str]) -> bool:
+        added = self._entries.get(key)
+        if added is not None and time.monotonic() - added >= self.ttl:
+            del self._entries[key]
+            added = None
+        return added is not None
+
+    def add(self, key: Tuple[int, str]):
+        self._entries[key] = time.monotonic()
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def job_key(job: Dict[str, Any]) -> int:
+    return hash((job['title'], job['description']))
+
+
+def unscored_models(models: List[str], prompt: str, job: Dict[str, Any], fallback_answers: FallbackAnswers) -> List[str]:
+    return [
+        model for model in models
+        if (job_key(job), model) not in fallback_answers
+        and not suitability_cache.contains(suitability_cache.make_key(model, prompt, job['title'], job['description']))
+    ]
+
+
+async def score_job(
+    job: Dict[str, Any],
+    models: List[str],
+    prompt: str,
+    semaphore: asyncio.Semaphore,
+    fallback_answers: FallbackAnswers
+) -> int:
+    """Score one job with each model, returning how many ratings succeeded"""
+    async def score(model: str) -> bool:
+        async with semaphore:
+            try:
+                response = await analyze_with_model(model, prompt, job['title'], job['description'])
+            except Exception as e:
+                # Not recorded anywhere, so the next poll retries it
+                logger.warning("Scoring %r with %s failed: %s", job['title'], model, e)
+                return False
+        if response.answered_by != model:
+            fallback_answers.add((job_key(job), model))
+        return True
+
+    return sum(await asyncio.gather(*[score(model) for model in models]))
+
+
+async def poll_once(
+    models: List[str],
+    prompt: str,
+    filters: Optional[Dict[str, Any]],
+    concurrency: int,
+    stop_after_scored: int,
+    max_jobs: int,
+    fallback_answers: FallbackAnswers
+) -> int:
+    """Score the new jobs at the head of the search results; returns the number of ratings added"""
+    semaphore = asyncio.Semaphore(concurrency)
+    jobs = iter_jobs(filters, page_size=50)
+    tasks = []
+    # Pages can shift while we read them; don't score one job twice in a poll
+    scheduled = set()
+    already_scored = 0
+    try:
+        for _ in range(max_jobs):
+            job = await asyncio.to_thread(next, jobs, None)
+            if job is None:
+                break
+
+            pending = unscored_models(models, prompt, job, fallback_answers) if job_key(job) not in scheduled else []
+            if not pending:
+                already_scored += 1
+                if already_scored >= stop_after_scored:
+                    break
+                continue
+
+            already_scored = 0
+            scheduled.add(job_key(job))
+            tasks.append(asyncio.create_task(score_job(job, pending, prompt, semaphore, fallback_answers)))
+            # Don't read further ahead than the scorers can keep up with
+            while sum(not task.done() for task in tasks) >= concurrency * 2:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        jobs.close()
+
+    return sum(await asyncio.gather(*tasks))
+
+
+async def run(args):
+    models = args.models.split(',') if args.models else available_models
+    prompt = company_info_prompt
+    if args.prompt_file:
+        with open(args.prompt_file) as f:
+            prompt = f.read()
+    filters = json.loads(args.filters) if args.filters else None
+
+    fallback_answers = FallbackAnswers()
+    while True:
+        try:
+            added = await poll_once(models, prompt, filters, args.concurrency, args.stop_after_scored, args.max_jobs, fallback_answers)
+            logger.info("Added %d ratings", added)
+        except Exception:
+            logger.exception("Poll failed")
+        if args.once:
+            return
+        await asyncio.sleep(args.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interval', type=float, default=300, help='Seconds between polls')
+    parser.add_argument('--once', action='store_true', help='Poll once and exit')
+    parser.add_argument('--models', help='Comma-separated models to score with (default: all)')
+    parser.add_argument('--prompt-file', help='Company prompt to score against (default: the built-in one)')
+    parser.add_argument('--filters', help='JSON search filters, as sent to /jobs/search')
+    parser.add_argument('--concurrency', type=int, default=8, help='Max model calls in flight')
+    parser.add_argument('--stop-after-scored', type=int, default=50, help='Stop a poll after this many already-scored jobs in a row')
+    parser.add_argument('--max-jobs', type=int, default=1000, help='Max jobs to look at per poll')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()